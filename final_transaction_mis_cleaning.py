@@ -1,11 +1,14 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
+import json
+import os
 import re
-import time
-from io import BytesIO
-from openpyxl import load_workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
+import tempfile
+from datetime import date
+
+from transaction_mis import BATCH_ZIP_NAME, COMBINED_STEM, DEFAULT_CHUNK_ROWS, MASTER_FILE_NAME, MIS_STEM, XLSX_MIME, IncrementalStore, JobQueueFull, JobRunner, MasterCache, ResultStore, run_batch, run_pipeline
+from transaction_mis.batch import store_prefix
+from transaction_mis.jobs import CANCELLED as JOB_CANCELLED, DONE as JOB_DONE, FAILED as JOB_FAILED
 
 st.set_page_config(page_title="Transaction Processing Model", layout="wide", initial_sidebar_state="collapsed")
 
@@ -37,31 +40,90 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def normalize_col(c):
-    return re.sub(r'[^a-z0-9]', '', str(c).lower())
+LOOKUP_LABELS = {'scheme': "Scheme", 'client': "Client", 'employee': "Employee", 'ntb': "NTB"}
+
+@st.cache_resource
+def get_master_cache():
+    # Shared by all sessions; set TRANSACTION_MIS_CACHE_DIR to also keep entries on disk
+    return MasterCache(disk_dir=os.environ.get("TRANSACTION_MIS_CACHE_DIR"))
+
+@st.cache_resource
+def get_job_runner():
+    # One pool for the whole server: TRANSACTION_MIS_JOB_WORKERS runs at a time, later submissions queue
+    return JobRunner(max_workers=int(os.environ.get("TRANSACTION_MIS_JOB_WORKERS", "2")))
+
+@st.cache_resource
+def get_result_store():
+    # Run outputs live on disk, not in session_state; TTL and size cap keep the directory bounded
+    root = os.environ.get("TRANSACTION_MIS_RESULTS_DIR") or os.path.join(tempfile.gettempdir(), "transaction_mis_results")
+    return ResultStore(root, ttl_seconds=int(os.environ.get("TRANSACTION_MIS_RESULTS_TTL_HOURS", "24")) * 3600)
+
+def incremental_path(name):
+    # Month-to-date stores are shared by everyone using the same name
+    root = os.environ.get("TRANSACTION_MIS_INCREMENTAL_DIR") or os.path.join(tempfile.gettempdir(), "transaction_mis_incremental")
+    return os.path.join(root, re.sub(r"[^A-Za-z0-9_-]", "_", name))
+
+def default_store_name(uploads):
+    # Month, signed-in user (when the app has login) and the file name without its
+    # dates: each day's export of a month-to-date file lands in the same store, while
+    # other users and other files get their own. A batch keeps one store per file
+    # under the same name (see get_incremental_dir and run_batch).
+    parts = [f"{date.today():%Y-%m}"]
+    if st.user.get("email"):
+        parts.append(st.user.get("email"))
+    if len(uploads) == 1:
+        parts.append(store_prefix(uploads[0].name))
+    return " ".join(parts)
+
+def get_incremental_store(name):
+    return IncrementalStore(incremental_path(name))
 
-def find_col(df, possible):
-    col_map = {normalize_col(c): c for c in df.columns}
-    for p in possible:
-        if normalize_col(p) in col_map:
-            return col_map[normalize_col(p)]
-    raise Exception(f"Missing column. Tried {possible}")
+def get_incremental_dir(name):
+    # Batches keep one store per transaction file under their own directory; the
+    # ".batch" suffix cannot clash with a sanitized single-file store name
+    return incremental_path(name) + ".batch"
 
-def strip_time_from_dates(df):
-    for col in df.columns:
-        if pd.api.types.is_datetime64_any_dtype(df[col]):
-            df[col] = df[col].dt.date
-    return df
+def batch_inputs(uploads):
+    # {file name: bytes}; a repeated upload name gets a " (2)" suffix so no file is dropped
+    inputs = {}
+    for upload in uploads:
+        stem, ext = os.path.splitext(upload.name)
+        name = upload.name
+        n = 1
+        while name in inputs:
+            n += 1
+            name = f"{stem} ({n}){ext}"
+        inputs[name] = upload.getvalue()
+    return inputs
+
+def process_into_store(store, run_id, run, *files, progress, **options):
+    # Runs on a job worker: outputs go straight into the run's store directory and
+    # a small JSON summary is saved next to them for whichever session collects it.
+    # run is run_pipeline for a single transaction file or run_batch for several.
+    result = run(*files, progress=progress, output_dir=store.path(run_id), **options)
+    summary = {key: value for key, value in result.items() if key not in ('mis_output', 'master_output', 'outputs', 'zip_output', 'files', 'mis_summary')}
+    summary['outputs'] = [os.path.basename(path) for path in result['outputs'].values()]
+    summary['mis_summary'] = result['mis_summary'].to_dict("records") if result['mis_summary'] is not None else None
+    if 'files' in result:
+        summary['files'] = [{key: value for key, value in entry.items() if key != 'outputs'} for entry in result['files']]
+    store.save_summary(run_id, summary)
+    return summary
 
 # Initialize session state
 if 'processed' not in st.session_state:
     st.session_state.processed = False
-if 'mis_output' not in st.session_state:
-    st.session_state.mis_output = None
-if 'master_output' not in st.session_state:
-    st.session_state.master_output = None
 if 'processing_stats' not in st.session_state:
     st.session_state.processing_stats = {}
+if 'output_files' not in st.session_state:
+    st.session_state.output_files = []
+if 'run_stats' not in st.session_state:
+    st.session_state.run_stats = None
+if 'batch_files' not in st.session_state:
+    st.session_state.batch_files = None
+if 'mis_summary' not in st.session_state:
+    st.session_state.mis_summary = None
+if 'job_id' not in st.session_state:
+    st.session_state.job_id = st.query_params.get("job")
 
 # Header section - centered
 st.markdown('<h1 class="main-header">📊 Transaction Processing Model</h1>', unsafe_allow_html=True)
@@ -71,11 +133,11 @@ st.divider()
 # File upload section
 col1, col2 = st.columns(2)
 with col1:
-    st.markdown("### 📥 1. Upload WS Transaction File")
-    input_file = st.file_uploader("Transaction file (Excel)", type=['xlsx'], key="txn")
+    st.markdown("### 📥 1. Upload WS Transaction File(s)")
+    input_files = st.file_uploader("Transaction file(s) (Excel) - upload several to process branch files in one batch", type=['xlsx'], key="txn", accept_multiple_files=True)
 with col2:
     st.markdown("### 👥 2. Upload System Client Master")
-    if input_file:
+    if input_files:
         system_client_file = st.file_uploader("Client Master (Excel)", type=['xlsx'], key="client")
     else:
         st.warning("⚠️ Upload WS Transaction File first")
@@ -84,355 +146,144 @@ with col2:
 col3, col4 = st.columns(2)
 with col3:
     st.markdown("### 📋 3. Upload System Scheme Master")
-    if input_file and system_client_file:
+    if input_files and system_client_file:
         system_scheme_file = st.file_uploader("Scheme Master (Excel)", type=['xlsx'], key="scheme")
     else:
         st.warning("⚠️ Upload Client Master first")
         system_scheme_file = None
 with col4:
     st.markdown("### 📂 4. Upload MASTER Excel File")
-    if input_file and system_client_file and system_scheme_file:
+    if input_files and system_client_file and system_scheme_file:
         master_file_raw = st.file_uploader("Main Master file (Excel)", type=['xlsx'], key="master")
     else:
         st.warning("⚠️ Upload Scheme Master first")
         master_file_raw = None
 
 # Process button - only show if all files uploaded and not yet processed
-if master_file_raw and not st.session_state.processed:
+if master_file_raw and not st.session_state.processed and not st.session_state.job_id:
+    opt1, opt2, opt3, opt4 = st.columns([2, 1, 1, 1])
+    extra_formats = opt1.multiselect("Also export Raw Dump / Working / Final as", ["parquet", "csv"], help="For downstream BI jobs that do not need Excel")
+    low_memory = opt2.checkbox("Low-memory mode", help=f"Stream the transaction file in chunks of {DEFAULT_CHUNK_ROWS:,} rows; use for very large month-end / YTD files")
+    profile_run = opt3.checkbox("Profile run", disabled=len(input_files) > 1, help="Capture a cProfile summary in the run diagnostics (slows processing down); single files only")
+    compact = opt4.checkbox("Compact memory mode", help="Hold repeated text columns (scheme, banker, category...) as categories while processing; cuts the memory a large file needs")
+    inc1, inc2 = st.columns([1, 2])
+    incremental = inc1.checkbox("Incremental month-to-date", disabled=low_memory, help="Reuse rows already processed in an earlier run of the same month-to-date file; only new or changed rows, and rows whose master entries changed, are processed again")
+    incremental_name = inc2.text_input("Month-to-date store", value=default_store_name(input_files), disabled=not incremental or low_memory, help="Runs with the same store name build on each other; the default is per month, user and file name without its dates")
     if st.button("🚀 Process All Files", type="primary", use_container_width=True):
         try:
-            proc_start = time.time()
-            
-            with st.spinner("🚀 Processing data... Please wait..."):
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                status_text.text("📂 Loading files...")
-                system_client = pd.read_excel(system_client_file)
-                system_scheme = pd.read_excel(system_scheme_file)
-                master_bytes = master_file_raw.getvalue()
-                master_file_io = BytesIO(master_bytes)
-                progress_bar.progress(5)
-                
-                status_text.text("👥 Updating Client Master...")
-                master_client = pd.read_excel(master_file_io, sheet_name="Client Master")
-                target_columns = ['CLIENTID', 'CLIENTNAME', 'CLIENTCODE', 'PANNUMBER', 'GROUPNAME', 'RELMGRNAME', 'BILLGROUP']
-                system_client_normalized = {normalize_col(c): c for c in system_client.columns}
-                
-                system_matched_cols = {}
-                for target_col in target_columns:
-                    if normalize_col(target_col) in system_client_normalized:
-                        system_matched_cols[target_col] = system_client_normalized[normalize_col(target_col)]
-                
-                if system_matched_cols:
-                    system_client_filtered = system_client[list(system_matched_cols.values())].copy()
-                    system_client_filtered.columns = list(system_matched_cols.keys())
-                else:
-                    raise Exception("No matching columns in System Client Master!")
-                
-                system_client_filtered['_clientcode_clean'] = system_client_filtered['CLIENTCODE'].astype(str).str.strip().str.replace(".0", "", regex=False).str.upper()
-                master_client['_clientcode_clean'] = master_client['CLIENTCODE'].astype(str).str.strip().str.replace(".0", "", regex=False).str.upper()
-                
-                master_clientcodes = set(master_client['_clientcode_clean'].unique())
-                system_clientcodes = set(system_client_filtered['_clientcode_clean'].unique())
-                missing_clientcodes = system_clientcodes - master_clientcodes
-                
-                if len(missing_clientcodes) > 0:
-                    missing_records = system_client_filtered[system_client_filtered['_clientcode_clean'].isin(missing_clientcodes)].copy().drop(columns=['_clientcode_clean'])
-                    master_columns = [col for col in master_client.columns if col != '_clientcode_clean']
-                    master_col_normalized = {normalize_col(c): c for c in master_columns}
-                    
-                    missing_records_mapped = pd.DataFrame()
-                    for std_col in missing_records.columns:
-                        if normalize_col(std_col) in master_col_normalized:
-                            master_col_name = master_col_normalized[normalize_col(std_col)]
-                            missing_records_mapped[master_col_name] = missing_records[std_col]
-                    
-                    for col in master_columns:
-                        if col not in missing_records_mapped.columns:
-                            missing_records_mapped[col] = ""
-                    
-                    missing_records_mapped = missing_records_mapped[master_columns]
-                    master_client_updated = pd.concat([master_client.drop(columns=['_clientcode_clean']), missing_records_mapped], ignore_index=True)
-                else:
-                    master_client_updated = master_client.drop(columns=['_clientcode_clean'])
-                
-                progress_bar.progress(15)
-                
-                status_text.text("📊 Updating Scheme Master...")
-                master_scheme = pd.read_excel(master_file_io, sheet_name="Scheme Master", header=1)
-                system_scheme_df = pd.read_excel(system_scheme_file, header=0)
-                
-                scheme_column_mapping = {'SYMBOLID': 'SYMBOLID', 'SYMBOLNAME': 'Scheme name', 'ISINCODE': 'ISIN', 'REFSYMBOL5': 'Symbolcode5', 'DIMNAME15': 'DIMNAME15 Old', 'ASTCLSNAME': 'ASTCLSNAME', 'DIMNAME13': 'DIMNAME13'}
-                system_scheme_normalized = {normalize_col(c): c for c in system_scheme_df.columns}
-                system_scheme_matched_cols = {}
-                
-                for system_col, master_col in scheme_column_mapping.items():
-                    if normalize_col(system_col) in system_scheme_normalized:
-                        system_scheme_matched_cols[master_col] = system_scheme_normalized[normalize_col(system_col)]
-                
-                if system_scheme_matched_cols:
-                    system_scheme_filtered = system_scheme_df[list(system_scheme_matched_cols.values())].copy()
-                    system_scheme_filtered.columns = list(system_scheme_matched_cols.keys())
-                else:
-                    raise Exception("No matching columns in System Scheme Master!")
-                
-                system_scheme_filtered['_symbolid_clean'] = system_scheme_filtered['SYMBOLID'].astype(str).str.strip().str.upper()
-                master_scheme['_symbolid_clean'] = master_scheme['SYMBOLID'].astype(str).str.strip().str.upper()
-                
-                master_symbolids = set(master_scheme['_symbolid_clean'].unique())
-                system_symbolids = set(system_scheme_filtered['_symbolid_clean'].unique())
-                missing_symbolids = system_symbolids - master_symbolids
-                
-                if len(missing_symbolids) > 0:
-                    missing_scheme_records = system_scheme_filtered[system_scheme_filtered['_symbolid_clean'].isin(missing_symbolids)].copy().drop(columns=['_symbolid_clean'])
-                    missing_scheme_records['DIMNAME15 - New'] = ""
-                    missing_scheme_records['ASTCLSNAME New'] = ""
-                    missing_scheme_records['Manufacturer Name'] = ""
-                    
-                    master_scheme_columns = [col for col in master_scheme.columns if col != '_symbolid_clean']
-                    for col in master_scheme_columns:
-                        if col not in missing_scheme_records.columns:
-                            missing_scheme_records[col] = ""
-                    
-                    missing_scheme_records = missing_scheme_records[master_scheme_columns]
-                    master_scheme_updated = pd.concat([master_scheme.drop(columns=['_symbolid_clean']), missing_scheme_records], ignore_index=True)
-                else:
-                    master_scheme_updated = master_scheme.drop(columns=['_symbolid_clean'])
-                
-                progress_bar.progress(25)
-                
-                status_text.text("💾 Saving Updated Master File...")
-                master_file_io.seek(0)
-                wb = load_workbook(master_file_io)
-                
-                if "Client Master" in wb.sheetnames:
-                    del wb["Client Master"]
-                ws_client = wb.create_sheet("Client Master", 0)
-                for r in dataframe_to_rows(master_client_updated, index=False, header=True):
-                    ws_client.append(r)
-                
-                if "Scheme Master" in wb.sheetnames:
-                    del wb["Scheme Master"]
-                ws_scheme = wb.create_sheet("Scheme Master", 1)
-                
-                master_file_io.seek(0)
-                original_scheme_headers = pd.read_excel(master_file_io, sheet_name="Scheme Master", nrows=1, header=None)
-                ws_scheme.append(original_scheme_headers.iloc[0].tolist())
-                
-                for r in dataframe_to_rows(master_scheme_updated, index=False, header=True):
-                    ws_scheme.append(r)
-                
-                master_output = BytesIO()
-                wb.save(master_output)
-                master_output.seek(0)
-                master_file_path = BytesIO(master_output.getvalue())
-                progress_bar.progress(35)
-                
-                status_text.text("📋 Loading Transaction Data...")
-                df = pd.read_excel(input_file)
-                base_rows = len(df)
-                original_cols = df.columns.tolist()
-                df = strip_time_from_dates(df)
-                
-                client_col = find_col(df, ["client name"])
-                ws_col = find_col(df, ["ws account code"])
-                sec_col = find_col(df, ["security code"])
-                trf_col = find_col(df, ["trfamt", "transfer amount"])
-                net_col = find_col(df, ["net amount", "amount"])
-                txn_col = find_col(df, ["tran desc", "transaction description"])
-                desc_col = find_col(df, ["descmemo", "desc memo", "description memo"])
-                
-                df["Length"] = df[ws_col].astype(str).str.len()
-                df["Del Tag"] = ""
-                df["Ambit First"] = ""
-                progress_bar.progress(40)
-                
-                status_text.text("🏷️ Applying Ambit First Tags...")
-                ambit_first = pd.read_excel(master_file_path, sheet_name="Ambit First")
-                ambit_first.columns = ambit_first.columns.astype(str).str.strip().str.lower().str.replace(" ", "_")
-                
-                df["_ws_clean"] = df[ws_col].astype(str).str.strip().str.replace(".0", "", regex=False)
-                ambit_first["_client_clean"] = ambit_first["clientcode"].astype(str).str.strip().str.replace(".0", "", regex=False)
-                ambit_first = ambit_first.drop_duplicates(subset=["_client_clean"])
-                
-                ambit_set = set(ambit_first["_client_clean"])
-                matches = df["_ws_clean"].isin(ambit_set)
-                df.loc[matches, "Ambit First"] = "Ambit First"
-                df["_ws"] = df["_ws_clean"]
-                progress_bar.progress(45)
-                
-                status_text.text("🏷️ Applying Del Tags...")
-                pan_condition = (df["Del Tag"] == "") & (df["Length"] == 10)
-                df.loc[pan_condition, "Del Tag"] = "Del PAN"
-                
-                pms_condition = ((df["Del Tag"] == "") & (df["Ambit First"] == "") & df["_ws"].str.upper().str.startswith(("ND", "DS", "DM")))
-                df.loc[pms_condition, "Del Tag"] = "Del PMS"
-                
-                awpl_condition = ((df["Del Tag"] == "") & df[client_col].str.contains("ambit wealth", case=False, na=False))
-                df.loc[awpl_condition, "Del Tag"] = "Del AWPL"
-                
-                afpl_condition = ((df["Del Tag"] == "") & df[client_col].str.contains("Ambit Finvest Private Limited", case=False, na=False))
-                df.loc[afpl_condition, "Del Tag"] = "Del AFPL"
-                
-                dummy_condition = ((df["Del Tag"] == "") & df[client_col].str.contains("dummy", case=False, na=False))
-                df.loc[dummy_condition, "Del Tag"] = "Del Dummy"
-                
-                cash_condition = ((df["Del Tag"] == "") & df[sec_col].str.contains("cash", case=False, na=False))
-                df.loc[cash_condition, "Del Tag"] = "Del Cash"
-                
-                tds_condition = ((df["Del Tag"] == "") & df[sec_col].str.contains("tds", case=False, na=False))
-                df.loc[tds_condition, "Del Tag"] = "Del TDSAccount"
-                
-                mfapp_condition = ((df["Del Tag"] == "") & df[sec_col].str.contains("mfapplication", case=False, na=False))
-                df.loc[mfapp_condition, "Del Tag"] = "Del MFApplication"
-                
-                intaccpur_condition = ((df["Del Tag"] == "") & df[sec_col].str.contains("intaccpur", case=False, na=False))
-                df.loc[intaccpur_condition, "Del Tag"] = "Del INTACCPUR"
-                progress_bar.progress(55)
-                
-                status_text.text("📝 Processing Transaction Types...")
-                tt = pd.read_excel(master_file_path, sheet_name="Trnx Type Update")
-                tt.columns = [str(c).strip() for c in tt.columns]
-                
-                tran_desc_col = tt.columns[0]
-                replace_col = tt.columns[1] if len(tt.columns) > 1 else None
-                delete_col = tt.columns[4] if len(tt.columns) > 4 else None
-                tt = tt.drop_duplicates(subset=[tran_desc_col])
-                
-                replace_map = {}
-                if replace_col:
-                    replace_map = dict(zip(tt[tran_desc_col].astype(str).str.strip(), tt[replace_col].astype(str).str.strip()))
-                
-                delete_lookup = set()
-                if delete_col:
-                    delete_lookup = set(tt[delete_col].dropna().astype(str).str.strip())
-                
-                df['_txn_clean'] = df[txn_col].astype(str).str.strip()
-                df["Revised Trnx Amount"] = np.where(pd.to_numeric(df[trf_col], errors="coerce") > 1, pd.to_numeric(df[trf_col], errors="coerce"), pd.to_numeric(df[net_col], errors="coerce"))
-                
-                broker_inflow_condition = ((df[desc_col].astype(str).str.strip() == "Broker Change") & (df[txn_col].astype(str).str.strip() == "InFlow"))
-                df["Consider"] = df['_txn_clean'].map(replace_map).fillna("")
-                df.loc[broker_inflow_condition, "Consider"] = "AUM Trf In"
-                
-                df["Delete"] = df['_txn_clean'].apply(lambda x: x if x in delete_lookup else "")
-                df["Trans Type 2"] = df["Consider"]
-                df["Gross Sales"] = np.where(df["Trans Type 2"].isin(["Purchase", "AUM Trf In", "Switch In", "SIP"]), "Gross Sales", "Redemption")
-                df["Net Sales"] = np.where(df["Trans Type 2"].isin(["Purchase", "AUM Trf In", "Switch In", "SIP", "Redemption", "AUM Trf Out", "Switch Out", "SWP"]), "Net Sales", "0")
-                
-                def calculate_amt_in_crs(row):
-                    revised_amt = row["Revised Trnx Amount"]
-                    if pd.isna(revised_amt):
-                        return 0
-                    amt_in_crs = revised_amt / 1e7
-                    if str(row["Gross Sales"]).strip() == "Redemption":
-                        amt_in_crs = -amt_in_crs
-                    return amt_in_crs
-                
-                df["Amt in Crs"] = df.apply(calculate_amt_in_crs, axis=1)
-                progress_bar.progress(65)
-                
-                status_text.text("🔍 Looking up Scheme Master...")
-                scheme = pd.read_excel(master_file_path, sheet_name="Scheme Master", header=1)
-                scheme.columns = scheme.columns.str.lower().str.strip()
-                scheme = scheme.drop_duplicates(subset=["symbolid"])
-                
-                df = df.merge(scheme[["symbolid", "dimname15 - new", "astclsname new", "dimname13", "manufacturer name"]], how="left", left_on=sec_col, right_on="symbolid")
-                df.rename(columns={"dimname15 - new": "Product New", "astclsname new": "Asset Class New", "dimname13": "Product Category New", "manufacturer name": "Manufacturer Name New"}, inplace=True)
-                df.drop(columns=["symbolid"], inplace=True)
-                
-                ambit_first_mask = (df["Ambit First"] == "Ambit First")
-                if ambit_first_mask.sum() > 0:
-                    df.loc[ambit_first_mask, "Product New"] = "GPC - PMS"
-                    df.loc[ambit_first_mask, "Asset Class New"] = "Other NDPMS"
-                    df.loc[ambit_first_mask, "Product Category New"] = "Equity PMS"
-                    df.loc[ambit_first_mask, "Manufacturer Name New"] = "GPC - Ambit First"
-                progress_bar.progress(75)
-                
-                status_text.text("🔍 Looking up Client Master...")
-                client = pd.read_excel(master_file_path, sheet_name="Client Master")
-                client.columns = client.columns.str.lower().str.strip().str.replace(" ", "_")
-                client["_client_clean"] = client["clientcode"].astype(str).str.strip().str.replace(".0", "", regex=False).str.upper()
-                client = client.drop_duplicates(subset=["_client_clean"], keep="last")
-                
-                df["_ws_upper"] = df["_ws"].str.upper()
-                df = df.merge(client[["_client_clean", "groupname", "pannumber", "relmgrname"]], how="left", left_on="_ws_upper", right_on="_client_clean")
-                df.rename(columns={"groupname": "Family Name as per Client Master", "pannumber": "Pan No", "relmgrname": "Banker Name"}, inplace=True)
-                df.drop(columns=["_client_clean", "_ws_upper"], inplace=True, errors='ignore')
-                progress_bar.progress(80)
-                
-                status_text.text("🔍 Looking up Employee Mapping...")
-                emp = pd.read_excel(master_file_path, sheet_name="Employee Mapping Master")
-                emp.columns = emp.columns.str.lower().str.strip().str.replace(" ", "_")
-                emp = emp.drop_duplicates(subset=["banker_name"])
-                
-                df = df.merge(emp[["banker_name", "banker_name_new", "banker_group_name", "group_tag"]], how="left", left_on="Banker Name", right_on="banker_name")
-                df.rename(columns={"banker_name_new": "Banker Name New", "banker_group_name": "Banker Group Name", "group_tag": "Banker Group Tag"}, inplace=True)
-                df.drop(columns=["banker_name"], inplace=True)
-                progress_bar.progress(85)
-                
-                status_text.text("🔍 Looking up NTB Data...")
-                ntb = pd.read_excel(master_file_path, sheet_name="NTB Data")
-                ntb.columns = ntb.columns.str.lower().str.strip().str.replace(" ", "_")
-                ntb = ntb.drop_duplicates(subset=["family_name"])
-                
-                df = df.merge(ntb[["family_name", "month", "fy"]], how="left", left_on="Family Name as per Client Master", right_on="family_name")
-                df.rename(columns={"month": "NTB Month", "fy": "NTB FY"}, inplace=True)
-                df.drop(columns=["family_name"], inplace=True)
-                
-                df["Family Name Final"] = ""
-                df["Pk Remark"] = ""
-                df["Extra column"] = ""
-                df["Month-New"] = ""
-                df["YTD Tag"] = ""
-                df["Month-New For Banker MIS"] = ""
-                progress_bar.progress(90)
-                
-                status_text.text("📋 Finalizing Data...")
-                final_column_order = [*original_cols, "Revised Trnx Amount", "Consider", "Delete", "Trans Type 2", "Gross Sales", "Net Sales", "Product New", "Asset Class New", "Product Category New", "Manufacturer Name New", "Banker Name", "Banker Name New", "Banker Group Name", "Banker Group Tag", "Amt in Crs", "Family Name as per Client Master", "Family Name Final", "Pk Remark", "Extra column", "Month-New", "YTD Tag", "Ambit First", "Pan No", "Month-New For Banker MIS", "NTB Month", "NTB FY", "Length", "Del Tag"]
-                final_column_order = [col for col in final_column_order if col in df.columns]
-                df = df[final_column_order]
-                
-                assert len(df) == base_rows, f"Row mismatch! Input={base_rows}, Output={len(df)}"
-                
-                df_working = df[df["Del Tag"] == ""].copy()
-                df_final = df_working[(df_working["Consider"].notna()) & (df_working["Consider"] != "") & (df_working["Delete"].isna() | (df_working["Delete"] == ""))].copy()
-                progress_bar.progress(95)
-                
-                status_text.text("💾 Saving Output Files...")
-                mis_output = BytesIO()
-                with pd.ExcelWriter(mis_output, engine='openpyxl') as writer:
-                    df.to_excel(writer, sheet_name='Raw Dump', index=False)
-                    df_working.to_excel(writer, sheet_name='Working', index=False)
-                    df_final.to_excel(writer, sheet_name='Final', index=False)
-                mis_output.seek(0)
-                
-                progress_bar.progress(100)
-                status_text.text("✅ Processing Complete!")
-                time.sleep(0.5)
-            
-            progress_bar.empty()
-            status_text.empty()
-            processing_time = time.time() - proc_start
-            
-            # Store results in session state
-            st.session_state.processed = True
-            st.session_state.mis_output = mis_output.getvalue()
-            st.session_state.master_output = master_output.getvalue()
-            st.session_state.processing_stats = {
-                'new_clients': len(missing_clientcodes),
-                'new_schemes': len(missing_symbolids),
-                'raw_rows': len(df),
-                'working_rows': len(df_working),
-                'final_rows': len(df_final),
-                'processing_time': processing_time
-            }
-            
+            # The job outlives this script run, so it gets the file contents rather than the uploader objects
+            store = get_result_store()
+            run_id = store.create()
+            use_incremental = incremental and not low_memory and incremental_name.strip()
+            masters = (system_client_file.getvalue(), system_scheme_file.getvalue(), master_file_raw.getvalue())
+            if len(input_files) == 1:
+                job_id = get_job_runner().submit(
+                    process_into_store,
+                    store, run_id, run_pipeline,
+                    input_files[0].getvalue(), *masters,
+                    label=input_files[0].name,
+                    job_id=run_id,
+                    cache=get_master_cache(),
+                    formats=("xlsx", *extra_formats),
+                    chunk_rows=DEFAULT_CHUNK_ROWS if low_memory else None,
+                    profile=profile_run,
+                    compact=compact,
+                    # Workbooks are only generated when first downloaded
+                    lazy=True,
+                    incremental=get_incremental_store(incremental_name) if use_incremental else None,
+                )
+            else:
+                # Masters are reconciled once and the transaction files processed in parallel
+                job_id = get_job_runner().submit(
+                    process_into_store,
+                    store, run_id, run_batch,
+                    batch_inputs(input_files), *masters,
+                    label=f"{len(input_files)} transaction files",
+                    job_id=run_id,
+                    cache=get_master_cache(),
+                    formats=("xlsx", *extra_formats),
+                    chunk_rows=DEFAULT_CHUNK_ROWS if low_memory else None,
+                    incremental_dir=get_incremental_dir(incremental_name) if use_incremental else None,
+                    compact=compact,
+                )
+            st.session_state.job_id = job_id
+            st.query_params["job"] = job_id
+            st.rerun()
+        except JobQueueFull as e:
+            store.discard(run_id)
+            st.warning(f"⏳ The server is busy: {e}")
+
+def clear_job():
+    st.session_state.job_id = None
+    if "job" in st.query_params:
+        del st.query_params["job"]
+
+def store_results(result):
+    st.session_state.processed = True
+    st.session_state.output_files = result['outputs']
+    st.session_state.run_stats = result['stats']
+    st.session_state.batch_files = result.get('files')
+    st.session_state.mis_summary = result.get('mis_summary')
+    st.session_state.processing_stats = {
+        'new_clients': result['new_clients'],
+        'new_schemes': result['new_schemes'],
+        'raw_rows': result['raw_rows'],
+        'working_rows': result['working_rows'],
+        'final_rows': result['final_rows'],
+        'reused_rows': result['reused_rows'],
+        'combined_error': result.get('combined_error'),
+        'zip_error': result.get('zip_error'),
+        'processing_time': result['processing_time']
+    }
+
+@st.fragment(run_every=1)
+def show_job_progress(job_id):
+    # Polls the background job without rerunning the whole page; a finished job
+    # triggers a full rerun so the results section below picks it up.
+    job = get_job_runner().get(job_id)
+    if job is None or job.done:
+        st.rerun()
+    position = get_job_runner().queue_position(job_id)
+    if position is not None:
+        st.info(f"⏳ Queued behind {position - 1} other job(s)" if position > 1 else "⏳ Next in line...")
+        if st.button("✖️ Cancel", key="cancel_job"):
+            get_job_runner().cancel(job_id)
             st.rerun()
-            
-        except Exception as e:
-            st.error(f"❌ Error: {str(e)}")
-            st.exception(e)
+    st.progress(job.pct)
+    st.text(job.text)
+    st.caption("You can leave this page; open the same link later to collect the results.")
+
+# Background job status - survives page reloads through the ?job= link
+job_id = st.session_state.job_id
+if job_id and not st.session_state.processed:
+    job = get_job_runner().get(job_id)
+    summary = get_result_store().load_summary(job_id) if job is None or job.status == JOB_DONE else None
+    if summary is not None:
+        # Finished - possibly in an earlier session and already dropped by the job runner
+        store_results(summary)
+        st.rerun()
+    elif job is None:
+        st.warning("⚠️ This processing job is no longer available. Please process the files again.")
+        clear_job()
+    elif job.status == JOB_DONE:
+        store_results(job.result)
+        st.rerun()
+    elif job.status == JOB_FAILED:
+        st.error(f"❌ Error: {job.error}")
+        with st.expander("Details"):
+            st.code(job.traceback, language=None)
+        if st.button("🔄 Try Again", use_container_width=True):
+            get_job_runner().discard(job_id)
+            get_result_store().discard(job_id)
+            clear_job()
+            st.rerun()
+    elif job.status == JOB_CANCELLED:
+        get_result_store().discard(job_id)
+        clear_job()
+        st.rerun()
+    else:
+        st.subheader(f"🚀 Processing {job.label}")
+        show_job_progress(job_id)
 
 # Show results if processing is complete
 if st.session_state.processed and st.session_state.processing_stats:
@@ -449,34 +300,96 @@ if st.session_state.processed and st.session_state.processing_stats:
     r1.metric("📊 Raw Dump Rows", stats['raw_rows'])
     r2.metric("🛠️ Working Rows", stats['working_rows'])
     r3.metric("🎯 Final Rows", stats['final_rows'])
+    if stats.get('reused_rows'):
+        st.caption(f"♻️ {stats['reused_rows']:,} of {stats['raw_rows']:,} rows reused from the month-to-date store")
     
     st.divider()
     
-    d1, d2 = st.columns(2)
-    d1.download_button(
-        "📥 Download Transaction MIS", 
-        data=st.session_state.mis_output, 
-        file_name="Transaction_MIS_Final.xlsx", 
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", 
-        use_container_width=True
-    )
-    d2.download_button(
-        "📥 Download Updated Master", 
-        data=st.session_state.master_output, 
-        file_name="Updated_Master_File.xlsx", 
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", 
-        use_container_width=True
-    )
+    batch_files = st.session_state.batch_files
+    if batch_files:
+        st.dataframe(pd.DataFrame(batch_files).set_index('name').reindex(columns=['raw_rows', 'working_rows', 'final_rows', 'reused_rows', 'seconds', 'error']), use_container_width=True)
+        failed = [entry['name'] for entry in batch_files if entry['error']]
+        if failed:
+            st.warning(f"⚠️ {len(failed)} file(s) failed and are not in the combined MIS: {', '.join(failed)}")
+        if stats.get('combined_error'):
+            st.warning(f"⚠️ The combined MIS could not be written: {stats['combined_error']}")
+        if stats.get('zip_error'):
+            st.warning(f"⚠️ The zip of all MIS files could not be written: {stats['zip_error']}")
+    
+    if st.session_state.mis_summary:
+        with st.expander("📊 MIS Summary: Amt in Crs of the Final rows", expanded=True):
+            st.dataframe(pd.DataFrame(st.session_state.mis_summary), hide_index=True, use_container_width=True)
+    
+    store = get_result_store()
+    run_id = st.session_state.job_id
+    mis_name = f"{COMBINED_STEM}.xlsx" if batch_files else f"{MIS_STEM}.xlsx"
+    
+    def stored_file(name):
+        # Read from the result store only when the button is clicked; outputs of a
+        # single-file run are generated then, on the first click
+        return lambda: store.read(run_id, name)
+    
+    if not store.exists(run_id):
+        st.warning("⚠️ These results have expired from the server. Please process the files again.")
+    else:
+        d1, d2 = st.columns(2)
+        if mis_name in st.session_state.output_files:
+            d1.download_button(
+                "📥 Download Combined Transaction MIS" if batch_files else "📥 Download Transaction MIS", 
+                data=stored_file(mis_name), 
+                file_name=mis_name, 
+                mime=XLSX_MIME, 
+                use_container_width=True
+            )
+        d2.download_button(
+            "📥 Download Updated Master", 
+            data=stored_file(MASTER_FILE_NAME), 
+            file_name=MASTER_FILE_NAME, 
+            mime=XLSX_MIME, 
+            use_container_width=True
+        )
+        
+        if batch_files and store.exists(run_id, BATCH_ZIP_NAME):
+            st.download_button(
+                "📥 Download all MIS files (zip)", 
+                data=stored_file(BATCH_ZIP_NAME), 
+                file_name=BATCH_ZIP_NAME, 
+                mime="application/zip", 
+                use_container_width=True
+            )
+        
+        extra_files = [name for name in st.session_state.output_files if name != mis_name]
+        if extra_files:
+            extra_cols = st.columns(len(extra_files))
+            for extra_col, name in zip(extra_cols, extra_files):
+                extra_col.download_button(f"📥 {name}", data=stored_file(name), file_name=name, mime="application/octet-stream", use_container_width=True)
     
     st.success(f"✅ Processing completed in {stats['processing_time']:.2f} seconds!")
     
+    run_stats = st.session_state.run_stats
+    if run_stats:
+        with st.expander("📈 Run diagnostics"):
+            st.dataframe(pd.DataFrame(run_stats['stages']).set_index('stage'), use_container_width=True)
+            if run_stats['lookups']:
+                hit_cols = st.columns(len(run_stats['lookups']))
+                for hit_col, (name, hits) in zip(hit_cols, run_stats['lookups'].items()):
+                    hit_col.metric(f"{LOOKUP_LABELS.get(name, name)} lookup hit rate", f"{hits['hit_rate']:.1%}" if hits['hit_rate'] is not None else "-")
+            if run_stats['profile']:
+                st.code(run_stats['profile'], language=None)
+            st.download_button("📥 Download diagnostics (JSON)", data=json.dumps(run_stats, indent=2, default=str), file_name="Transaction_MIS_Run_Stats.json", mime="application/json")
+    
     # Reset button
     if st.button("🔄 Process New Files", type="secondary", use_container_width=True):
         st.session_state.processed = False
-        st.session_state.mis_output = None
-        st.session_state.master_output = None
+        st.session_state.output_files = []
         st.session_state.processing_stats = {}
+        st.session_state.run_stats = None
+        st.session_state.batch_files = None
+        st.session_state.mis_summary = None
+        get_job_runner().discard(st.session_state.job_id)
+        get_result_store().discard(st.session_state.job_id)
+        clear_job()
         st.rerun()
 
-elif not input_file:
+elif not input_files and not st.session_state.job_id:
     st.info("👋 Welcome! Start by uploading the **WS Transaction File** in block 1.")
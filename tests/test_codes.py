@@ -0,0 +1,36 @@
+from io import BytesIO
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from transaction_mis import run_pipeline
+from transaction_mis.synthetic import generate_workbooks
+
+CODE = "AB.01"
+
+
+def set_column(ws, name, value, rows):
+    col = [cell.value for cell in ws[1]].index(name) + 1
+    for row in rows:
+        ws.cell(row=row, column=col, value=value)
+
+def test_codes_with_dot_zero_match_on_both_sides(tmp_path):
+    paths = generate_workbooks(str(tmp_path), 200)
+    # The same text code in the WS file, the Client Master and Ambit First
+    wb = load_workbook(paths['txn'])
+    set_column(wb.worksheets[0], "WS Account Code", CODE, range(2, 12))
+    wb.save(paths['txn'])
+    wb = load_workbook(paths['master'])
+    client = wb["Client Master"]
+    header = [cell.value for cell in client[1]]
+    client.append([{"CLIENTCODE": CODE, "CLIENTNAME": "Dotted Client", "PANNUMBER": "ABCDE0001F", "RELMGRNAME": "Banker 001"}.get(name) for name in header])
+    wb["Ambit First"].append([CODE])
+    wb.save(paths['master'])
+
+    result = run_pipeline(paths['txn'], paths['client'], paths['scheme'], paths['master'], parse_workers=1)
+    raw = pd.read_excel(BytesIO(result['mis_output']), sheet_name="Raw Dump")
+    rows = raw[raw["WS Account Code"] == CODE]
+    assert len(rows) == 10
+    assert (rows["Ambit First"] == "Ambit First").all()
+    assert (rows["Pan No"] == "ABCDE0001F").all()
+    assert (rows["Banker Name"] == "Banker 001").all()
@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from transaction_mis import IncrementalStore, run_pipeline
+from transaction_mis.batch import store_names, store_prefix
+from transaction_mis.synthetic import generate_workbooks
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture(scope="module")
+def workbooks(tmp_path_factory):
+    paths = generate_workbooks(str(tmp_path_factory.mktemp("data")), 400)
+    # NTB FY entered as a number on some rows and as text on the others
+    wb = load_workbook(paths['master'])
+    ws = wb["NTB Data"]
+    fy_col = [cell.value for cell in ws[1]].index("FY") + 1
+    for row in range(2, ws.max_row + 1, 2):
+        ws.cell(row=row, column=fy_col, value=2025)
+    wb.save(paths['master'])
+    return paths
+
+
+def run(paths, output_dir, **kwargs):
+    output_dir.mkdir()
+    result = run_pipeline(paths['txn'], paths['client'], paths['scheme'], paths['master'], formats=("xlsx", "csv"), parse_workers=1, output_dir=str(output_dir), **kwargs)
+    sheets = pd.read_excel(result['outputs']["Transaction_MIS_Final.xlsx"], sheet_name=None)
+    csvs = {name: open(path).read() for name, path in result['outputs'].items() if name.endswith(".csv")}
+    return result, sheets, csvs
+
+def test_reused_rows_match_a_run_without_store(workbooks, tmp_path):
+    _, expected_sheets, expected_csvs = run(workbooks, tmp_path / "plain")
+    assert {2025, "FY 2025-26"} <= set(expected_sheets["Raw Dump"]["NTB FY"].dropna())
+
+    store = IncrementalStore(str(tmp_path / "store"))
+    for i, reused in enumerate((0, 400)):
+        result, sheets, csvs = run(workbooks, tmp_path / f"incremental{i}", incremental=store)
+        assert result['reused_rows'] == reused
+        assert sheets.keys() == expected_sheets.keys()
+        for name, sheet in expected_sheets.items():
+            pd.testing.assert_frame_equal(sheets[name], sheet, obj=name)
+        assert csvs == expected_csvs
+
+def test_daily_exports_share_a_store_name():
+    names = ["WS_Mumbai_2025-10-16.xlsx", "WS_Mumbai_17.10.25.xlsx", "WS Mumbai 18 Oct 2025 (2).xlsx"]
+    assert [store_prefix(name) for name in names] == ["WS_Mumbai", "WS_Mumbai", "WS Mumbai"]
+    # Files of one batch never share a store
+    assert store_names(["Delhi_20251016.xlsx", "Delhi_20251017.xlsx", "Pune.xlsx"]) == {"Delhi_20251016.xlsx": "Delhi", "Delhi_20251017.xlsx": "Delhi_2", "Pune.xlsx": "Pune"}
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from transaction_mis.master import build_lookups
+from transaction_mis.pipeline import apply_lookups, tag_ambit_first
+from transaction_mis.rules import default_del_tag_rules
+
+COLS = {'ws': "WS Account Code", 'client': "Client Name", 'sec': "Security Code"}
+LOOKUP_COLUMNS = ["Product New", "Asset Class New", "Product Category New", "Manufacturer Name New", "Family Name as per Client Master", "Pan No", "Banker Name", "Banker Name New", "Banker Group Name", "Banker Group Tag", "NTB Month", "NTB FY"]
+
+
+def master():
+    # Duplicate keys (the Client Master keeps its last row, the others their first),
+    # missing keys on both sides and chains that break at the banker or the family
+    return {
+        'scheme': pd.DataFrame({
+            "SYMBOLID": ["MF1", "MF2", "MF1", np.nan, 101],
+            "DIMNAME15 - New": ["Mutual Fund", "PMS", "Duplicate", "No Symbol", "Numeric"],
+            "ASTCLSNAME New": ["Equity", "Equity", "Duplicate", np.nan, "Debt"],
+            "DIMNAME13": ["Equity MF", "Equity PMS", "Duplicate", "No Symbol", "Debt MF"],
+            "Manufacturer Name": ["HDFC AMC", np.nan, "Duplicate", "No Symbol", "SBI Funds"],
+        }),
+        'client': pd.DataFrame({
+            "CLIENTCODE": ["WS1", "ws2", "WS1", "WS3", "WS4", np.nan, 12345, "WS6"],
+            "GROUPNAME": ["Family A", "Family B", "Family A2", "Family Z", np.nan, "Blank Code", "Family B", "Family A"],
+            "PANNUMBER": ["PAN1", "PAN2", "PAN1-LAST", "PAN3", "PAN4", "PAN-BLANK", "PAN5", np.nan],
+            "RELMGRNAME": ["Banker 1", "Banker 2", "Banker 1", "Banker 9", "Banker 2", np.nan, np.nan, "Banker 1"],
+        }),
+        'employee': pd.DataFrame({
+            "Banker Name": ["Banker 1", "Banker 2", "Banker 1", np.nan],
+            "Banker Name New": ["B1 New", "B2 New", "Duplicate", "No Banker"],
+            "Banker Group Name": ["Group 1", "Group 2", "Duplicate", "No Banker"],
+            "Group Tag": ["Wealth", np.nan, "Duplicate", "No Banker"],
+        }),
+        'ntb': pd.DataFrame({
+            "Family Name": ["Family A", "Family B", "Family A", np.nan],
+            "Month": ["Apr", "May", "Duplicate", "No Family"],
+            "FY": ["FY 2025-26", 2025, "Duplicate", "No Family"],
+        }),
+        'ambit_first': pd.DataFrame({"ClientCode": ["WS999"]}),
+        'trnx_type': pd.DataFrame({"Tran Desc": ["Purchase"], "Replace": ["Purchase"]}),
+        'del_tag_rules': None,
+    }
+
+def reference_lookups(df, master):
+    """The four left merges the app ran, on the same master sheets."""
+    sec_col = COLS['sec']
+    scheme = master['scheme'].copy()
+    scheme.columns = scheme.columns.str.lower().str.strip()
+    scheme = scheme.drop_duplicates(subset=["symbolid"])
+    df = df.merge(scheme[["symbolid", "dimname15 - new", "astclsname new", "dimname13", "manufacturer name"]], how="left", left_on=sec_col, right_on="symbolid")
+    df.rename(columns={"dimname15 - new": "Product New", "astclsname new": "Asset Class New", "dimname13": "Product Category New", "manufacturer name": "Manufacturer Name New"}, inplace=True)
+    df.drop(columns=["symbolid"], inplace=True)
+
+    client = master['client'].copy()
+    client.columns = client.columns.str.lower().str.strip().str.replace(" ", "_")
+    client["_client_clean"] = client["clientcode"].astype(str).str.strip().str.replace(".0", "", regex=False).str.upper()
+    client = client.drop_duplicates(subset=["_client_clean"], keep="last")
+    df["_ws_upper"] = df[COLS['ws']].astype(str).str.strip().str.replace(".0", "", regex=False).str.upper()
+    df = df.merge(client[["_client_clean", "groupname", "pannumber", "relmgrname"]], how="left", left_on="_ws_upper", right_on="_client_clean")
+    df.rename(columns={"groupname": "Family Name as per Client Master", "pannumber": "Pan No", "relmgrname": "Banker Name"}, inplace=True)
+    df.drop(columns=["_client_clean", "_ws_upper"], inplace=True)
+
+    emp = master['employee'].copy()
+    emp.columns = emp.columns.str.lower().str.strip().str.replace(" ", "_")
+    emp = emp.drop_duplicates(subset=["banker_name"])
+    df = df.merge(emp[["banker_name", "banker_name_new", "banker_group_name", "group_tag"]], how="left", left_on="Banker Name", right_on="banker_name")
+    df.rename(columns={"banker_name_new": "Banker Name New", "banker_group_name": "Banker Group Name", "group_tag": "Banker Group Tag"}, inplace=True)
+    df.drop(columns=["banker_name"], inplace=True)
+
+    ntb = master['ntb'].copy()
+    ntb.columns = ntb.columns.str.lower().str.strip().str.replace(" ", "_")
+    ntb = ntb.drop_duplicates(subset=["family_name"])
+    df = df.merge(ntb[["family_name", "month", "fy"]], how="left", left_on="Family Name as per Client Master", right_on="family_name")
+    df.rename(columns={"month": "NTB Month", "fy": "NTB FY"}, inplace=True)
+    return df.drop(columns=["family_name"])
+
+def transactions(rows, seed):
+    rng = np.random.default_rng(seed)
+    codes = ["WS1", "ws2", "WS2", " WS3 ", "WS4", "WS5", 12345, 12345.0, "WS6", None, np.nan]
+    securities = ["MF1", "MF2", "MF3", 101, None, np.nan]
+    return pd.DataFrame({
+        COLS['ws']: rng.choice(np.array(codes, dtype=object), rows),
+        COLS['client']: "Client",
+        COLS['sec']: rng.choice(np.array(securities, dtype=object), rows),
+    })
+
+def values(column):
+    return [None if pd.isna(v) else v for v in np.asarray(column, dtype=object)]
+
+
+@pytest.mark.parametrize("compact", [False, True])
+@pytest.mark.parametrize("seed", [0, 1])
+def test_lookups_match_left_merges(seed, compact):
+    sheets = master()
+    lookups = {**build_lookups(sheets), 'del_tag_rules': default_del_tag_rules()}
+    df = transactions(2000, seed)
+    expected = reference_lookups(df, sheets)
+
+    joined = apply_lookups(tag_ambit_first(df.copy(), COLS, lookups), COLS, lookups, compact=compact)
+    for col in LOOKUP_COLUMNS:
+        assert values(joined[col]) == values(expected[col]), col
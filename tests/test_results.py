@@ -0,0 +1,32 @@
+import os
+import time
+
+from transaction_mis import ResultStore
+
+
+def write(store, run_id, name, size):
+    with open(store.path(run_id, name), "wb") as f:
+        f.write(b"x" * size)
+
+def test_size_eviction_keeps_runs_being_written(tmp_path):
+    store = ResultStore(str(tmp_path), max_bytes=1000)
+    finished = store.create()
+    write(store, finished, "Transaction_MIS_Final.xlsx", 600)
+    store.save_summary(finished, {'raw_rows': 1})
+    running = store.create()
+    write(store, running, "Transaction_MIS_Final.frame", 600)
+    # A long job: its run is older than the finished one
+    os.utime(store.path(running), (time.time() - 120, time.time() - 120))
+    os.utime(store.path(finished), (time.time() - 60, time.time() - 60))
+
+    new = store.create()
+    assert not store.exists(finished)
+    assert store.exists(running) and os.path.exists(store.path(running, "Transaction_MIS_Final.frame"))
+    assert store.exists(new)
+
+def test_expired_runs_are_removed(tmp_path):
+    store = ResultStore(str(tmp_path), ttl_seconds=60)
+    old = store.create()
+    os.utime(store.path(old), (time.time() - 120, time.time() - 120))
+    store.create()
+    assert not os.path.exists(store.path(old))
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from transaction_mis.pipeline import tag_ambit_first, tag_del
+from transaction_mis.rules import default_del_tag_rules, parse_del_tag_rules
+
+COLS = {'ws': "WS Account Code", 'client': "Client Name", 'sec': "Security Code"}
+AMBIT_SET = {"ND00000001", "DS0002", "WS000010"}
+
+
+def reference_tags(df, ambit_set):
+    """The nine Del Tag masks as the app applied them, one after the other."""
+    df = df.copy()
+    ws_col, client_col, sec_col = COLS['ws'], COLS['client'], COLS['sec']
+    df["Length"] = df[ws_col].astype(str).str.len()
+    df["Del Tag"] = ""
+    df["Ambit First"] = ""
+    df["_ws_clean"] = df[ws_col].astype(str).str.strip().str.replace(".0", "", regex=False)
+    df.loc[df["_ws_clean"].isin(ambit_set), "Ambit First"] = "Ambit First"
+    df["_ws"] = df["_ws_clean"]
+
+    df.loc[(df["Del Tag"] == "") & (df["Length"] == 10), "Del Tag"] = "Del PAN"
+    df.loc[(df["Del Tag"] == "") & (df["Ambit First"] == "") & df["_ws"].str.upper().str.startswith(("ND", "DS", "DM")), "Del Tag"] = "Del PMS"
+    df.loc[(df["Del Tag"] == "") & df[client_col].str.contains("ambit wealth", case=False, na=False), "Del Tag"] = "Del AWPL"
+    df.loc[(df["Del Tag"] == "") & df[client_col].str.contains("Ambit Finvest Private Limited", case=False, na=False), "Del Tag"] = "Del AFPL"
+    df.loc[(df["Del Tag"] == "") & df[client_col].str.contains("dummy", case=False, na=False), "Del Tag"] = "Del Dummy"
+    df.loc[(df["Del Tag"] == "") & df[sec_col].str.contains("cash", case=False, na=False), "Del Tag"] = "Del Cash"
+    df.loc[(df["Del Tag"] == "") & df[sec_col].str.contains("tds", case=False, na=False), "Del Tag"] = "Del TDSAccount"
+    df.loc[(df["Del Tag"] == "") & df[sec_col].str.contains("mfapplication", case=False, na=False), "Del Tag"] = "Del MFApplication"
+    df.loc[(df["Del Tag"] == "") & df[sec_col].str.contains("intaccpur", case=False, na=False), "Del Tag"] = "Del INTACCPUR"
+    return df
+
+def transactions(rows, seed):
+    rng = np.random.default_rng(seed)
+    # Codes, names and securities that hit several rules at once, miss them all, or are missing
+    codes = ["ND00000001", "ND00000002", "DS0002", "dm77", " DS0003 ", "ABCDE1234F", "WS000010", "WS000011", 1234567890, 12345.0, None, np.nan]
+    names = ["Ambit Wealth Dummy", "ambit finvest private limited", "Dummy Ambit Wealth Pvt", "Client A", "CLIENT DUMMY", 12345, None, np.nan]
+    securities = ["CASH", "cashtds", "TDS MFApplication", "mfapplication-01", "IntAccPur", "MF000001", 101, None, np.nan]
+    return pd.DataFrame({
+        COLS['ws']: rng.choice(np.array(codes, dtype=object), rows),
+        COLS['client']: rng.choice(np.array(names, dtype=object), rows),
+        COLS['sec']: rng.choice(np.array(securities, dtype=object), rows),
+    })
+
+def classify(df, rules, ambit_set=AMBIT_SET):
+    lookups = {'ambit_set': ambit_set, 'del_tag_rules': rules}
+    return tag_del(tag_ambit_first(df.copy(), COLS, lookups), COLS, lookups)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_default_rules_match_the_mask_sequence(seed):
+    df = transactions(3000, seed)
+    expected = reference_tags(df, AMBIT_SET)
+    tagged = classify(df, default_del_tag_rules())
+
+    assert tagged["Ambit First"].tolist() == expected["Ambit First"].tolist()
+    assert tagged["Del Tag"].tolist() == expected["Del Tag"].tolist()
+    # Every rule fires somewhere, so precedence between them is exercised
+    assert set(default_del_tag_rules()["tag"]) <= set(tagged["Del Tag"])
+
+def test_sheet_rules():
+    # Read from Excel, a Pattern column holding numbers comes back as floats
+    sheet = pd.DataFrame({
+        "Tag": ["Del Ten", "Del 99", "Del Wealth", None, "Del Cash"],
+        "Column": ["Length", "WS Account Code", "Client Name", "Client Name", "Security Code"],
+        "Match": ["Equals", "prefix", "contains", "contains", "CONTAINS"],
+        "Pattern": [10.0, 99.0, "a.b (pvt)", "ignored", "cash"],
+        "Skip Ambit First": ["no", "Yes", None, None, "no"],
+    })
+    rules = parse_del_tag_rules(sheet)
+    assert rules["pattern"].tolist() == ["10", "99", "a.b (pvt)", "cash"]
+    assert rules["skip_ambit_first"].tolist() == [False, True, False, False]
+
+    df = pd.DataFrame({
+        COLS['ws']: ["ABCDE1234F", "99001", 99002, "99003", "WS1", "WS2", "WS3", None],
+        COLS['client']: ["A.B (Pvt) Ltd", "A.B (Pvt) Ltd", None, "Client", "AXB (Pvt)", "a.b (pvt)", "Client", "Client"],
+        COLS['sec']: ["CASH", "MF1", "CASH", "MF1", "MF1", "MF1", "cash a/c", "MF1"],
+    })
+    tagged = classify(df, rules, ambit_set={"99003"})
+    # Length wins over the others; 99003 is Ambit First, which the 99 prefix rule skips;
+    # "a.b (pvt)" is matched as text, not as a regular expression
+    assert tagged["Del Tag"].tolist() == ["Del Ten", "Del 99", "Del 99", "", "", "Del Wealth", "Del Cash", ""]
+
+def test_invalid_sheet_rules():
+    with pytest.raises(Exception, match="missing columns"):
+        parse_del_tag_rules(pd.DataFrame({"Tag": ["Del X"], "Column": ["Client Name"], "Match": ["contains"]}))
+    with pytest.raises(Exception, match="Invalid Del Tag rule"):
+        parse_del_tag_rules(pd.DataFrame({"Tag": ["Del X"], "Column": ["Branch"], "Match": ["contains"], "Pattern": ["x"]}))
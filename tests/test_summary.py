@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+
+from transaction_mis.pipeline import SUMMARY_COLUMNS, combine_summaries, summarize
+
+
+def chunk(fy):
+    rows = len(fy)
+    return pd.DataFrame({
+        "Banker Group Name": ["Group 1"] * rows,
+        "Product Category New": ["Equity MF"] * rows,
+        "Gross Sales": ["Gross Sales"] * rows,
+        "Net Sales": ["Net Sales"] * rows,
+        "NTB FY": fy,
+        "Amt in Crs": [1.0] * rows,
+    })
+
+def test_chunk_summaries_line_up():
+    # Every row matched (Int64) in one chunk, some rows unmatched (float64) in the other
+    first = chunk(pd.array([2025, 2025], dtype="Int64"))
+    second = chunk(np.array([2025.0, np.nan]))
+    summary = combine_summaries([summarize(df, np.ones(len(df), dtype=bool)) for df in (first, second)])
+
+    assert list(summary.columns) == SUMMARY_COLUMNS
+    assert summary["NTB FY"].tolist() == ["", "2025"]
+    assert summary["Transactions"].tolist() == [1, 3]
+    assert summary["Amt in Crs"].tolist() == [1.0, 3.0]
@@ -0,0 +1,24 @@
+from .utils import normalize_col, find_col, strip_time_from_dates
+from .batch import BATCH_ZIP_NAME, COMBINED_STEM, run_batch
+from .cache import MasterCache, content_key
+from .deferred import materialize
+from .incremental import IncrementalStore
+from .instrument import RunStats
+from .jobs import JobQueueFull, JobRunner
+from .results import ResultStore
+from .master import load_master, build_lookups
+from .outputs import OUTPUT_FORMATS, SUMMARY_SHEET, MisWriter
+from .reader import DEFAULT_CHUNK_ROWS, iter_parsed, load_transactions, open_transaction_chunks
+from .pipeline import (
+    MASTER_FILE_NAME,
+    MIS_STEM,
+    XLSX_MIME,
+    reconcile_masters,
+    save_master_workbook,
+    process_transactions,
+    process_loaded_transactions,
+    process_frame_incremental,
+    process_transactions_streaming,
+    run_pipeline,
+    summarize,
+)
@@ -0,0 +1,271 @@
+import multiprocessing
+import os
+import re
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .incremental import IncrementalStore
+from .instrument import RunStats, stage
+from .outputs import FramePart, MisWriter, parquet_schema, iter_part, merge_schemas, mis_targets
+from .pipeline import DERIVED_COLUMNS, MASTER_FILE_NAME, MIS_STEM, _no_progress, combine_summaries, process_transactions, reconcile_masters, save_master_workbook
+
+COMBINED_STEM = f"{MIS_STEM}_Combined"
+BATCH_ZIP_NAME = "Transaction_MIS_Batch.zip"
+SOURCE_COLUMN = "Source File"
+
+_worker_lookups = None
+
+
+def _init_worker(lookups):
+    # Each worker process receives the reconciled lookups once and only reads them
+    global _worker_lookups
+    _worker_lookups = lookups
+
+
+# Dates in a file name (2025-10-17, 20251017, 17.10.25, 17 Oct 2025...) and a
+# browser's " (2)" copy suffix; see store_prefix
+_DATE_PARTS = re.compile(
+    r"\d{4}([-_.])\d{1,2}\1\d{1,2}|\d{8}|\d{1,2}([-_.])\d{1,2}\2\d{2,4}|\(\d+\)"
+    r"|\d{0,2}[-_. ]?(?<![a-z])(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sept?(?:ember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)(?![a-z])[-_.' ]?\d{0,4}",
+    re.IGNORECASE,
+)
+
+def store_prefix(name):
+    """The part of a transaction file name that stays the same from one month-to-date
+    export to the next: the base name without dates or a " (2)" suffix, e.g.
+    "WS_Mumbai" for "WS_Mumbai_2025-10-17.xlsx"."""
+    base = _DATE_PARTS.sub(" ", os.path.splitext(os.path.basename(name))[0])
+    base = re.sub(r"[-_. ]*\s[-_. ]*", " ", base).strip("-_. ")
+    return base or "transactions"
+
+def _unique(names, key):
+    unique = {}
+    seen = {}
+    for name in names:
+        base = key(name)
+        seen[base] = seen.get(base, 0) + 1
+        unique[name] = base if seen[base] == 1 else f"{base}_{seen[base]}"
+    return unique
+
+def batch_names(names):
+    """Base name per input file name (the file name without extension), made unique
+    when two uploads share a name. A file's MIS is <base>_MIS."""
+    return _unique(names, lambda name: os.path.splitext(os.path.basename(name))[0])
+
+def store_names(names):
+    """Incremental store name per input file name: its store_prefix, made unique
+    within the batch, so each day's export of a branch file reuses the same store."""
+    return _unique(names, store_prefix)
+
+def process_batch_file(input_file, output_dir, stem, formats=("xlsx",), chunk_rows=None, write_stats=False, incremental_path=None, part_path=None, compact=False, lookups=None):
+    """Process one transaction file of a batch into output_dir against lookups (by
+    default the ones _init_worker gave this worker process).
+
+    incremental_path is the file's own IncrementalStore directory, if any. With
+    part_path the processed rows are also pickled there (see FramePart). compact
+    processes the file in the categorical form of pipeline.compact_frame."""
+    start = time.time()
+    stats = RunStats(frame_memory=write_stats)
+    incremental = IncrementalStore(incremental_path) if incremental_path else None
+    part = FramePart(part_path) if part_path else None
+    try:
+        result = process_transactions(
+            input_file, lookups if lookups is not None else _worker_lookups,
+            formats=formats, output_dir=output_dir, stem=stem, chunk_rows=chunk_rows, stats=stats,
+            incremental=incremental, extra_writers=[part] if part is not None else (), compact=compact,
+        )
+    finally:
+        if part is not None:
+            part.close()
+    if write_stats:
+        with open(os.path.join(output_dir, f"{stem}_stats.json"), "w") as f:
+            f.write(stats.to_json())
+    return {
+        'outputs': result['outputs'],
+        'raw_rows': result['raw_rows'],
+        'working_rows': result['working_rows'],
+        'final_rows': result['final_rows'],
+        'reused_rows': result['reused_rows'],
+        'mis_summary': result['mis_summary'],
+        'seconds': time.time() - start,
+        'columns': part.columns if part is not None else None,
+        'stats': stats.to_dict(),
+    }
+
+def write_combined(parts, formats, output_dir, stem=COMBINED_STEM, summary=None):
+    """One MIS over all files of a batch, with a leading Source File column.
+
+    parts is [(source name, part path, columns)]; files with different columns are
+    aligned on the union of their transaction columns. Rows are streamed from the
+    parts one frame at a time. Parquet takes one schema over every part (see
+    outputs.merge_schemas), so a column that is text in one file and numeric in
+    another is written as text. summary is the batch's Summary sheet. Returns
+    {file name: path}."""
+    originals = {}
+    derived = set()
+    for _, _, columns in parts:
+        for col in columns:
+            if col in DERIVED_COLUMNS:
+                derived.add(col)
+            else:
+                originals.setdefault(col, None)
+    columns = [*originals, *(col for col in DERIVED_COLUMNS if col in derived)]
+
+    def frames():
+        for source, path, _ in parts:
+            for df, working_mask, final_mask in iter_part(path):
+                df = df.reindex(columns=columns)
+                df.insert(0, SOURCE_COLUMN, source)
+                yield df, working_mask, final_mask
+
+    schema = merge_schemas(parquet_schema(df, widen=True) for df, _, _ in frames()) if "parquet" in formats else None
+    targets, files = mis_targets(formats, stem, output_dir)
+    writers = [MisWriter(fmt, targets[fmt], widen=True, schema=schema) for fmt in formats]
+    try:
+        for df, working_mask, final_mask in frames():
+            for writer in writers:
+                writer.write(df, working_mask, final_mask)
+        for writer in writers:
+            writer.close(summary)
+    except Exception:
+        # No half-written combined files are left behind for the zip or a download
+        for path in files.values():
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    return files
+
+def write_zip(path, files):
+    """Zip {archive name: path}. xlsx and Parquet files are compressed already and are stored as is."""
+    try:
+        with zipfile.ZipFile(path, "w") as zf:
+            for name, file_path in files.items():
+                compression = zipfile.ZIP_DEFLATED if name.endswith(".csv") or name.endswith(".json") else zipfile.ZIP_STORED
+                zf.write(file_path, name, compress_type=compression)
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return path
+
+def run_batch(inputs, system_client_file, system_scheme_file, master_file, output_dir, progress=_no_progress, cache=None, formats=("xlsx",), chunk_rows=None, workers=None, incremental_dir=None, write_stats=False, combined=True, zip_outputs=True, compact=False):
+    """Process several WS transaction files against one reconciled MASTER.
+
+    inputs maps file name to path or bytes. The masters are parsed, reconciled and
+    indexed once; the transaction files are then processed in parallel by up to
+    workers processes (default: one per file, capped at the CPU count; 1 processes
+    them in turn in this process), each holding a read-only copy of the lookups. Each
+    file's MIS is written to output_dir as <file>_MIS. With combined, all rows also go
+    into one COMBINED_STEM MIS, and with zip_outputs the per-file and combined outputs
+    are collected in BATCH_ZIP_NAME. 'mis_summary' adds up the files' summaries (see
+    pipeline.summarize). compact processes every file in compact memory mode (see
+    pipeline.compact_frame). A file that fails is reported in its 'files' entry and
+    left out of the combined MIS; the other files are still processed. A failure to
+    write the combined MIS or the zip is reported in 'combined_error' or 'zip_error'
+    and leaves the per-file results in place. With incremental_dir each file keeps an
+    IncrementalStore there named by store_names, so the next day's export of the same
+    file reuses it."""
+    if incremental_dir and chunk_rows:
+        raise Exception("Incremental mode needs the whole transaction file; it cannot be combined with chunk_rows")
+    if not inputs:
+        raise Exception("No transaction files given")
+    proc_start = time.time()
+    stats = RunStats()
+    os.makedirs(output_dir, exist_ok=True)
+
+    with stage(stats, "reconcile_masters"):
+        reconciled = reconcile_masters(system_client_file, system_scheme_file, master_file, lambda pct, text: progress(int(pct * 30 / 35), text), cache)
+    with stage(stats, "save_master"):
+        master_path = os.path.join(output_dir, MASTER_FILE_NAME)
+        with open(master_path, "wb") as f:
+            f.write(save_master_workbook(reconciled['master_bytes'], reconciled['new_client_rows'], reconciled['new_scheme_rows']))
+    progress(35, f"⚙️ Processing {len(inputs)} transaction files...")
+
+    bases = batch_names(inputs)
+    stores = store_names(inputs)
+    stems = {name: f"{base}_MIS" for name, base in bases.items()}
+    files = {name: {'name': name, 'stem': stems[name], 'error': None} for name in inputs}
+    combined_outputs = {}
+    summaries = {}
+    with tempfile.TemporaryDirectory(dir=output_dir) as parts_dir:
+        def job_args(name):
+            part_path = os.path.join(parts_dir, f"{stems[name]}.part") if combined else None
+            incremental_path = os.path.join(incremental_dir, stores[name]) if incremental_dir else None
+            return inputs[name], output_dir, stems[name], formats, chunk_rows, write_stats, incremental_path, part_path, compact
+
+        def finished(name, result):
+            file_stats = result.pop('stats')
+            summaries[name] = result.pop('mis_summary')
+            for entry in file_stats['stages']:
+                stats.add_stage(entry['stage'], entry['seconds'], entry['rows_in'], entry['rows_out'], entry['peak_growth_mb'], entry['frame_mb'])
+            for lookup, hits in file_stats['lookups'].items():
+                stats.count_matches(lookup, hits['matched'], hits['rows'])
+            files[name].update(result)
+            done = sum(entry['error'] is not None or 'raw_rows' in entry for entry in files.values())
+            progress(35 + int(55 * done / len(files)), f"✅ Processed {name} ({done}/{len(files)})")
+
+        if workers is None:
+            workers = min(len(inputs), os.cpu_count() or 1)
+        with stage(stats, "process_files"):
+            if workers <= 1 or len(inputs) == 1:
+                for name in inputs:
+                    try:
+                        finished(name, process_batch_file(*job_args(name), lookups=reconciled['lookups']))
+                    except Exception as e:
+                        files[name]['error'] = str(e)
+            else:
+                # Spawned workers (see reader.iter_parsed); the lookups reach them through initargs
+                with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker, initargs=(reconciled['lookups'],)) as pool:
+                    futures = {pool.submit(process_batch_file, *job_args(name)): name for name in inputs}
+                    for future in as_completed(futures):
+                        name = futures[future]
+                        try:
+                            finished(name, future.result())
+                        except Exception as e:
+                            files[name]['error'] = str(e)
+
+        succeeded = [entry for entry in files.values() if entry['error'] is None]
+        summary = combine_summaries([summaries[entry['name']] for entry in succeeded]) if succeeded else None
+        combined_error = None
+        if combined and succeeded:
+            progress(90, "📋 Writing combined MIS...")
+            with stage(stats, "write_combined"):
+                parts = [(entry['name'], os.path.join(parts_dir, f"{entry['stem']}.part"), entry['columns']) for entry in succeeded]
+                try:
+                    combined_outputs = write_combined(parts, formats, output_dir, summary=summary)
+                except Exception as e:
+                    combined_error = str(e)
+        for entry in files.values():
+            entry.pop('columns', None)
+
+    zip_path = zip_error = None
+    if zip_outputs and succeeded:
+        progress(95, "🗜️ Zipping outputs...")
+        with stage(stats, "write_zip"):
+            archive = {os.path.basename(path): path for entry in succeeded for path in entry['outputs'].values()}
+            archive.update(combined_outputs)
+            try:
+                zip_path = write_zip(os.path.join(output_dir, BATCH_ZIP_NAME), archive)
+            except Exception as e:
+                zip_error = str(e)
+
+    progress(100, "✅ Processing Complete!")
+    return {
+        'outputs': combined_outputs,
+        'zip_output': zip_path,
+        'combined_error': combined_error,
+        'zip_error': zip_error,
+        'master_output': master_path,
+        'files': list(files.values()),
+        'new_clients': reconciled['new_clients'],
+        'new_schemes': reconciled['new_schemes'],
+        'raw_rows': sum(entry['raw_rows'] for entry in succeeded),
+        'working_rows': sum(entry['working_rows'] for entry in succeeded),
+        'final_rows': sum(entry['final_rows'] for entry in succeeded),
+        'reused_rows': sum(entry['reused_rows'] for entry in succeeded),
+        'mis_summary': summary,
+        'processing_time': time.time() - proc_start,
+        'stats': stats.to_dict(),
+    }
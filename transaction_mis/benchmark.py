@@ -0,0 +1,275 @@
+import argparse
+import json
+import os
+import platform
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from .master import build_lookups, load_master
+from .outputs import OUTPUT_FORMATS, write_mis_bytes
+from .pipeline import (
+    MIS_STEM, apply_lookups, compact_frame, finalize, map_transaction_types, reconcile_client_master,
+    reconcile_scheme_master, save_master_workbook, summarize, tag_ambit_first, tag_del,
+)
+from .reader import load_transactions, parse_input, transaction_columns
+from .synthetic import SYNTHETIC_FILES, XLSX_MAX_ROWS, generate_frames, generate_workbooks
+from .utils import read_bytes, strip_time_from_dates
+
+BENCHMARK_SCHEMA = 1
+DEFAULT_SIZES = (10_000, 100_000)
+
+# A stage only counts as regressed when it is both relatively and absolutely slower
+# (or bigger), so noise on stages that take a few milliseconds is ignored.
+DEFAULT_TIME_THRESHOLD = 0.15
+DEFAULT_MEMORY_THRESHOLD = 0.15
+MIN_SECONDS_DELTA = 0.05
+MIN_MB_DELTA = 1.0
+
+_MB = 1024 ** 2
+
+
+class StageTimer:
+    """Records wall time and, while tracemalloc is tracing, the peak memory each
+    stage allocated on top of what was live when it started."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name, func, *args):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            start_mem = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = func(*args)
+        seconds = time.perf_counter() - start
+        stage = {'seconds': seconds}
+        if tracing:
+            stage['peak_mb'] = (tracemalloc.get_traced_memory()[1] - start_mem) / _MB
+        self.stages[name] = stage
+        return result
+
+
+def _run_stages(timer, inputs, formats, compact=False):
+    """The pipeline stages in run order, each timed separately. inputs is either
+    {role: path} from generate_workbooks or the frames of generate_frames; compact
+    runs the stages on the categorical frame of pipeline.compact_frame."""
+    from_files = isinstance(inputs['txn'], str)
+    if from_files:
+        master = timer.run("parse_master", load_master, inputs['master'])
+        system_client, system_scheme = timer.run("parse_system_masters", lambda: (parse_input('client', inputs['client']), parse_input('scheme', inputs['scheme'])))
+    else:
+        master = dict(inputs['master'])
+        system_client, system_scheme = inputs['client'], inputs['scheme']
+
+    def reconcile():
+        client = reconcile_client_master(system_client, master['client'])
+        scheme = reconcile_scheme_master(system_scheme, master['scheme'])
+        return client, scheme
+    (master['client'], _, new_client_rows), (master['scheme'], _, new_scheme_rows) = timer.run("reconcile", reconcile)
+    lookups = timer.run("build_lookups", build_lookups, master)
+
+    if from_files:
+        df, cols = timer.run("load_transactions", load_transactions, inputs['txn'])
+    else:
+        df = strip_time_from_dates(inputs['txn'].copy())
+        cols = transaction_columns(df)
+    original_cols = df.columns.tolist()
+    base_rows = len(df)
+
+    if compact:
+        df = timer.run("compact_frame", compact_frame, df)
+    df = timer.run("tag_ambit_first", tag_ambit_first, df, cols, lookups, compact)
+    df = timer.run("tag_del", tag_del, df, cols, lookups, compact)
+    df = timer.run("map_transaction_types", map_transaction_types, df, cols, lookups, compact)
+    df = timer.run("apply_lookups", apply_lookups, df, cols, lookups, None, compact)
+    df, working_mask, final_mask = timer.run("finalize", finalize, df, original_cols, base_rows, compact)
+    summary = timer.run("summarize", summarize, df, final_mask)
+    timer.run("write_outputs", write_mis_bytes, df, working_mask, final_mask, formats, MIS_STEM, summary)
+
+    if from_files:
+        master_bytes = read_bytes(inputs['master'])
+        timer.run("save_master", save_master_workbook, master_bytes, new_client_rows, new_scheme_rows)
+    return len(df)
+
+def benchmark_size(rows, data_dir=None, seed=0, repeat=1, formats=("xlsx",), memory=True, compact=False):
+    """Benchmark every stage on rows synthetic transactions.
+
+    Up to the worksheet row limit the inputs are real workbooks (generated once into
+    data_dir and reused); larger sizes start from in-memory frames and skip the parse
+    stages. Times are the best of repeat runs; memory comes from one extra run under
+    tracemalloc, which is slower and therefore never timed."""
+    if rows <= XLSX_MAX_ROWS:
+        if data_dir is None:
+            raise Exception("data_dir is required for sizes that fit in a workbook")
+        size_dir = os.path.join(data_dir, f"rows_{rows}_seed_{seed}")
+        paths = {kind: os.path.join(size_dir, name) for kind, name in SYNTHETIC_FILES.items()}
+        if not all(os.path.exists(p) for p in paths.values()):
+            paths = generate_workbooks(size_dir, rows, seed)
+        inputs, mode = paths, "workbook"
+    else:
+        if "xlsx" in formats:
+            raise Exception(f"{rows:,} rows do not fit in an xlsx worksheet; benchmark them with parquet or csv output")
+        inputs, mode = generate_frames(rows, seed), "frame"
+
+    best = {}
+    for _ in range(repeat):
+        timer = StageTimer()
+        _run_stages(timer, inputs, formats, compact)
+        for name, stage in timer.stages.items():
+            best[name] = min(best.get(name, stage['seconds']), stage['seconds'])
+
+    stages = {name: {'seconds': seconds} for name, seconds in best.items()}
+    if memory:
+        timer = StageTimer()
+        tracemalloc.start()
+        try:
+            _run_stages(timer, inputs, formats, compact)
+        finally:
+            tracemalloc.stop()
+        for name, stage in timer.stages.items():
+            stages[name]['peak_mb'] = stage['peak_mb']
+
+    return {
+        'rows': rows,
+        'mode': mode,
+        'repeat': repeat,
+        'formats': list(formats),
+        'compact': compact,
+        'stages': stages,
+        'total_seconds': sum(s['seconds'] for s in stages.values()),
+    }
+
+def run_benchmarks(sizes=DEFAULT_SIZES, data_dir="benchmark_data", seed=0, repeat=1, formats=("xlsx",), memory=True, compact=False, report=print):
+    runs = []
+    for rows in sizes:
+        report(f"Benchmarking {rows:,} rows...")
+        runs.append(benchmark_size(rows, data_dir, seed, repeat, formats, memory, compact))
+        report(format_run(runs[-1]))
+    return {
+        'schema': BENCHMARK_SCHEMA,
+        'created': datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'openpyxl': openpyxl.__version__,
+            'cpus': os.cpu_count(),
+        },
+        'runs': runs,
+    }
+
+
+def format_run(run):
+    lines = [f"{run['rows']:>12,} rows ({run['mode']}, best of {run['repeat']})",
+             f"  {'stage':<24}{'seconds':>10}{'peak MB':>10}"]
+    for name, stage in run['stages'].items():
+        peak = f"{stage['peak_mb']:>10.1f}" if 'peak_mb' in stage else f"{'-':>10}"
+        lines.append(f"  {name:<24}{stage['seconds']:>10.3f}{peak}")
+    lines.append(f"  {'total':<24}{run['total_seconds']:>10.3f}")
+    return "\n".join(lines)
+
+def _settings(run):
+    # Baselines saved before --compact existed ran without it
+    return bool(run.get('compact', False)), tuple(sorted(run.get('formats', ())))
+
+def compare_results(baseline, current, time_threshold=DEFAULT_TIME_THRESHOLD, memory_threshold=DEFAULT_MEMORY_THRESHOLD):
+    """Stage-by-stage comparison of two run_benchmarks results, matched on row count,
+    compact mode and output formats; runs of the same size with other settings are
+    reported as not comparable instead of compared.
+
+    Returns (lines, regressions): a printable report and the list of
+    (rows, stage, metric, old, new) entries beyond the thresholds."""
+    old_runs = {(run['rows'], *_settings(run)): run for run in baseline['runs']}
+    old_sizes = {run['rows'] for run in baseline['runs']}
+    lines = []
+    regressions = []
+    for run in current['runs']:
+        old = old_runs.get((run['rows'], *_settings(run)))
+        if old is None:
+            if run['rows'] in old_sizes:
+                compact, formats = _settings(run)
+                lines.append(f"{run['rows']:,} rows: baseline ran with other settings, not compared (this run: compact={compact}, formats={','.join(formats)})")
+            else:
+                lines.append(f"{run['rows']:,} rows: not in baseline")
+            continue
+        lines.append(f"{run['rows']:,} rows")
+        for name, stage in run['stages'].items():
+            if name not in old['stages']:
+                lines.append(f"  {name:<24}new stage")
+                continue
+            for metric, threshold, min_delta in (('seconds', time_threshold, MIN_SECONDS_DELTA), ('peak_mb', memory_threshold, MIN_MB_DELTA)):
+                if metric not in stage or metric not in old['stages'][name]:
+                    continue
+                before, after = old['stages'][name][metric], stage[metric]
+                change = (after - before) / before if before else 0.0
+                regressed = change > threshold and after - before > min_delta
+                flag = "  REGRESSION" if regressed else ""
+                lines.append(f"  {name:<24}{metric:<9}{before:>10.3f} -> {after:>10.3f} ({change:+.0%}){flag}")
+                if regressed:
+                    regressions.append((run['rows'], name, metric, before, after))
+    return lines, regressions
+
+
+def _sizes(value):
+    try:
+        sizes = [int(v.replace("_", "")) for v in value.split(",") if v.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError("sizes must be comma separated row counts")
+    if not sizes or min(sizes) <= 0:
+        raise argparse.ArgumentTypeError("sizes must be comma separated row counts")
+    return sizes
+
+def _formats(value):
+    formats = tuple(dict.fromkeys(f.strip().lower() for f in value.split(",") if f.strip()))
+    if not formats or any(f not in OUTPUT_FORMATS for f in formats):
+        raise argparse.ArgumentTypeError(f"formats must be a comma separated subset of {', '.join(OUTPUT_FORMATS)}")
+    return formats
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m transaction_mis.benchmark",
+        description="Time every pipeline stage on synthetic data and compare against a saved baseline.",
+    )
+    parser.add_argument("--sizes", type=_sizes, default=list(DEFAULT_SIZES), help="comma separated transaction row counts (default: 10000,100000)")
+    parser.add_argument("--data-dir", default="benchmark_data", help="where generated workbooks are kept and reused (default: benchmark_data)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="timed runs per size; the best time is kept (default: 1)")
+    parser.add_argument("-f", "--formats", type=_formats, default=("xlsx",), help="output formats written by the write_outputs stage (default: xlsx)")
+    parser.add_argument("--compact", action="store_true", help="run the stages in compact (categorical) memory mode")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run that measures peak memory per stage")
+    parser.add_argument("--save", help="write the results as JSON to this file")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --save to compare against")
+    parser.add_argument("--time-threshold", type=float, default=DEFAULT_TIME_THRESHOLD, help="allowed relative slowdown per stage (default: 0.15)")
+    parser.add_argument("--memory-threshold", type=float, default=DEFAULT_MEMORY_THRESHOLD, help="allowed relative peak memory growth per stage (default: 0.15)")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    results = run_benchmarks(args.sizes, args.data_dir, args.seed, args.repeat, args.formats, memory=not args.no_memory, compact=args.compact)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        lines, regressions = compare_results(baseline, results, args.time_threshold, args.memory_threshold)
+        print("\n".join(lines))
+        if regressions:
+            print(f"{len(regressions)} stage metric(s) regressed beyond the thresholds")
+            return 1
+        print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,204 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+_log = logging.getLogger(__name__)
+
+
+def content_key(*blobs):
+    h = hashlib.sha256()
+    for blob in blobs:
+        h.update(len(blob).to_bytes(8, "little"))
+        h.update(blob)
+    return h.hexdigest()
+
+def estimate_size(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (set, frozenset, list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+# On-disk layout: one directory per key. DataFrames, sets and str->str mappings are
+# stored as Parquet; anything else (counts) goes in meta.json. Values Parquet cannot
+# hold as they are (object columns mixing numbers and text, as in SYMBOLID, NTB FY
+# or reconciled client codes) are pickled instead, so they load back unchanged.
+# A dict whose values are all scalars is a mapping, otherwise it is a nested namespace.
+
+def _is_mapping(value):
+    return not any(isinstance(v, (pd.DataFrame, dict, set, frozenset, list)) for v in value.values())
+
+def _is_mixed(frame):
+    return any(frame[col].dtype == object and pd.api.types.infer_dtype(frame[col], skipna=True).startswith("mixed") for col in frame.columns)
+
+def _dump_table(value, frame, path, meta, name, kind):
+    if not _is_mixed(frame):
+        try:
+            frame.to_parquet(os.path.join(path, f"{name}.parquet"), index=False)
+            meta[name] = {"kind": kind}
+            return
+        except Exception:
+            pass
+    with open(os.path.join(path, f"{name}.pkl"), "wb") as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    meta[name] = {"kind": kind, "format": "pickle"}
+
+def _dump(value, path, meta, name):
+    if isinstance(value, pd.DataFrame):
+        _dump_table(value, value, path, meta, name, "frame")
+    elif isinstance(value, (set, frozenset)):
+        _dump_table(value, pd.DataFrame({"value": list(value)}), path, meta, name, "set")
+    elif isinstance(value, dict) and value and _is_mapping(value):
+        _dump_table(value, pd.DataFrame({"key": list(value.keys()), "value": list(value.values())}), path, meta, name, "mapping")
+    elif isinstance(value, dict):
+        meta[name] = {"kind": "namespace", "items": {}}
+        for k, v in value.items():
+            _dump(v, path, meta[name]["items"], f"{name}.{k}")
+        meta[name]["keys"] = list(value.keys())
+    else:
+        meta[name] = {"kind": "value", "value": value}
+
+def _load(path, meta, name):
+    entry = meta[name]
+    kind = entry["kind"]
+    if kind == "value":
+        return entry["value"]
+    if kind == "namespace":
+        return {k: _load(path, entry["items"], f"{name}.{k}") for k in entry["keys"]}
+    if entry.get("format") == "pickle":
+        with open(os.path.join(path, f"{name}.pkl"), "rb") as f:
+            return pickle.load(f)
+    frame = pd.read_parquet(os.path.join(path, f"{name}.parquet"))
+    if kind == "set":
+        return set(frame["value"])
+    if kind == "mapping":
+        return dict(zip(frame["key"], frame["value"]))
+    return frame
+
+
+class MasterCache:
+    """Size-bounded LRU cache of parsed master sheets and lookup indexes.
+
+    Entries are keyed on a content hash of the uploaded files (see content_key), so
+    a repeat run with an unchanged MASTER skips parsing and index building. When
+    disk_dir is given and pyarrow is installed, entries are also written there (as
+    Parquet, or pickled where Parquet cannot hold a value) and survive restarts; the disk tier is bounded by max_disk_bytes.
+    Cached values are shared between runs and must be treated as read-only."""
+
+    def __init__(self, max_bytes=512 * 1024 ** 2, max_entries=16, disk_dir=None, max_disk_bytes=2 * 1024 ** 3):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir if disk_dir and HAS_PYARROW else None
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self):
+        return sum(self._sizes.values())
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        value = self._read_disk(key)
+        if value is not None:
+            self._put_memory(key, value)
+        return value
+
+    def put(self, key, value):
+        self._put_memory(key, value)
+        self._write_disk(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+
+    def _put_memory(self, key, value):
+        size = estimate_size(value)
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._sizes[key] = size
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self.size > self.max_bytes):
+                old, _ = self._entries.popitem(last=False)
+                del self._sizes[old]
+
+    def _entry_dir(self, key):
+        return os.path.join(self.disk_dir, key)
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._entry_dir(key)
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            value = _load(path, meta, "entry")
+        except Exception:
+            shutil.rmtree(path, ignore_errors=True)
+            return None
+        os.utime(path)
+        return value
+
+    def _write_disk(self, key, value):
+        if not self.disk_dir:
+            return
+        path = self._entry_dir(key)
+        tmp_path = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+        try:
+            os.makedirs(tmp_path, exist_ok=True)
+            meta = {}
+            _dump(value, tmp_path, meta, "entry")
+            with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(tmp_path, path)
+        except Exception:
+            _log.warning("Could not save master cache entry %s to %s; it stays in memory only", key, self.disk_dir, exc_info=True)
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return
+        self._evict_disk()
+
+    def _evict_disk(self):
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            path = os.path.join(self.disk_dir, name)
+            if not os.path.isdir(path) or ".tmp" in name:
+                continue
+            size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            entries.append((os.path.getmtime(path), size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        while len(entries) > 1 and total > self.max_disk_bytes:
+            _, size, path = entries.pop(0)
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
@@ -0,0 +1,84 @@
+import argparse
+import os
+import time
+
+from .batch import BATCH_ZIP_NAME, COMBINED_STEM, run_batch
+from .cache import MasterCache
+from .outputs import OUTPUT_FORMATS
+
+def parse_formats(value):
+    formats = [f.strip().lower() for f in value.split(",") if f.strip()]
+    unknown = [f for f in formats if f not in OUTPUT_FORMATS]
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(f"formats must be a comma separated subset of {', '.join(OUTPUT_FORMATS)}")
+    return tuple(dict.fromkeys(formats))
+
+def find_transaction_files(directory):
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(".xlsx") and not name.startswith("~$")
+    )
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m transaction_mis",
+        description="Process a directory of WS transaction files against one MASTER and write one MIS per file.",
+    )
+    parser.add_argument("transactions_dir", help="directory containing WS transaction .xlsx files")
+    parser.add_argument("--master", required=True, help="MASTER Excel file")
+    parser.add_argument("--client-master", required=True, help="System Client Master Excel file")
+    parser.add_argument("--scheme-master", required=True, help="System Scheme Master Excel file")
+    parser.add_argument("-o", "--output-dir", default="mis_output", help="where MIS files and the updated master are written (default: mis_output)")
+    parser.add_argument("-f", "--formats", type=parse_formats, default=("xlsx",), help="comma separated output formats: xlsx, parquet, csv (default: xlsx)")
+    parser.add_argument("--chunk-rows", type=int, default=None, help="stream each transaction file through the pipeline this many rows at a time to bound memory")
+    parser.add_argument("--cache-dir", default=None, help="keep parsed master sheets and lookup indexes here between runs (needs pyarrow)")
+    parser.add_argument("--incremental-dir", default=None, help="keep each file's enriched rows here and only process new or changed rows on the next run (needs pyarrow)")
+    parser.add_argument("--compact", action="store_true", help="hold repeated text columns as categories while processing to cut memory on large files")
+    parser.add_argument("--stats", action="store_true", help="write per-stage timings, memory, row counts and lookup hit rates as <file>_MIS_stats.json")
+    parser.add_argument("--combined", action="store_true", help=f"also write one {COMBINED_STEM} MIS over all files, with a Source File column")
+    parser.add_argument("--zip", action="store_true", help=f"also collect the per-file (and combined) MIS files in {BATCH_ZIP_NAME}")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of worker processes (default: CPU count)")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.incremental_dir and args.chunk_rows:
+        print("--incremental-dir needs whole files and cannot be combined with --chunk-rows")
+        return 1
+
+    files = find_transaction_files(args.transactions_dir)
+    if not files:
+        print(f"No .xlsx files found in {args.transactions_dir}")
+        return 1
+
+    start = time.time()
+    cache = MasterCache(disk_dir=args.cache_dir) if args.cache_dir else None
+    result = run_batch(
+        {os.path.basename(path): path for path in files},
+        args.client_master, args.scheme_master, args.master, args.output_dir,
+        cache=cache, formats=args.formats, chunk_rows=args.chunk_rows, workers=args.workers,
+        incremental_dir=args.incremental_dir, write_stats=args.stats, combined=args.combined, zip_outputs=args.zip,
+        compact=args.compact,
+    )
+    print(f"Master: {result['new_clients']} new clients, {result['new_schemes']} new schemes -> {result['master_output']}")
+
+    failed = 0
+    for entry, path in zip(result['files'], files):
+        if entry['error'] is not None:
+            failed += 1
+            print(f"FAILED {path}: {entry['error']}")
+            continue
+        reused = f" reused={entry['reused_rows']}" if args.incremental_dir else ""
+        out_path = ", ".join(entry['outputs'].values())
+        print(f"{path}: raw={entry['raw_rows']} working={entry['working_rows']} final={entry['final_rows']}{reused} ({entry['seconds']:.2f}s) -> {out_path}")
+    if result['outputs']:
+        print(f"Combined: final={result['final_rows']} -> {', '.join(result['outputs'].values())}")
+    if result['combined_error']:
+        print(f"FAILED combined MIS: {result['combined_error']}")
+    if result['zip_output']:
+        print(f"Zip -> {result['zip_output']}")
+    if result['zip_error']:
+        print(f"FAILED zip: {result['zip_error']}")
+
+    print(f"Processed {len(files) - failed}/{len(files)} files in {time.time() - start:.2f}s")
+    return 1 if failed or result['combined_error'] or result['zip_error'] else 0
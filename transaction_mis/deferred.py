@@ -0,0 +1,143 @@
+import json
+import os
+import pickle
+import threading
+
+import pandas as pd
+
+from .outputs import MisWriter, iter_part, mis_file_names
+
+# Registry of the deferred outputs in a directory: {file name: how to generate it}
+DEFERRED_FILE = "deferred.json"
+
+# Outputs are generated on the thread that asks for them (a download in the app), so
+# at most this many builds run at once in the process; further requests wait
+MAX_BUILDS = int(os.environ.get("TRANSACTION_MIS_BUILD_WORKERS", "2"))
+
+_guard = threading.Lock()
+_builds = threading.BoundedSemaphore(MAX_BUILDS)
+# Build key -> [lock, number of requests holding or waiting for it]; dropped with the last
+_locks = {}
+
+
+def _registry_path(output_dir):
+    return os.path.join(output_dir, DEFERRED_FILE)
+
+def _load(output_dir):
+    try:
+        with open(_registry_path(output_dir)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def _register(output_dir, entries):
+    with _guard:
+        registry = _load(output_dir)
+        registry.update(entries)
+        tmp_path = f"{_registry_path(output_dir)}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(registry, f)
+        os.replace(tmp_path, _registry_path(output_dir))
+
+
+def defer_mis(output_dir, part_name, formats, stem, summary=None):
+    """Register the MIS files of each of formats as deferred instead of writing them.
+
+    part_name is the outputs.FramePart file in output_dir that holds the processed
+    rows and their Working and Final masks; summary is the frame for the xlsx Summary
+    sheet. Returns {file name: path} like outputs.write_mis_files, except that the
+    files only appear once materialize() is called for them."""
+    summary_name = None
+    if summary is not None:
+        summary_name = f"{part_name}.summary"
+        summary.to_pickle(os.path.join(output_dir, summary_name))
+    entries = {}
+    for fmt in formats:
+        for name in mis_file_names(stem, fmt).values():
+            entries[name] = {'kind': 'mis', 'format': fmt, 'stem': stem, 'part': part_name, 'summary': summary_name}
+    _register(output_dir, entries)
+    return {name: os.path.join(output_dir, name) for name in entries}
+
+def defer_call(output_dir, name, func, *args):
+    """Register output_dir/name as deferred; its content is the bytes func(*args)
+    returns. func must be a module-level function, as it is pickled with args until
+    the file is generated. Returns the file's path."""
+    source = f"{name}.call"
+    with open(os.path.join(output_dir, source), "wb") as f:
+        pickle.dump((func, args), f, protocol=pickle.HIGHEST_PROTOCOL)
+    _register(output_dir, {name: {'kind': 'call', 'source': source}})
+    return os.path.join(output_dir, name)
+
+def is_deferred(path):
+    output_dir, name = os.path.split(path)
+    return name in _load(output_dir)
+
+def output_names(output_dir):
+    """Output files of output_dir, generated or not, without the deferred sources."""
+    registry = _load(output_dir)
+    internal = {DEFERRED_FILE}
+    for entry in registry.values():
+        internal.update(entry[key] for key in ('part', 'summary', 'source') if entry.get(key))
+    present = {name for name in os.listdir(output_dir) if name not in internal and not name.endswith(".tmp")}
+    return sorted(present | set(registry))
+
+def materialize(path):
+    """Return path, generating the file first if it was deferred and is not there yet.
+
+    Files are generated once and then served as written; concurrent requests for
+    the same file (or for files generated together, like the csv sheets of one MIS)
+    wait for a single build, and at most MAX_BUILDS builds run at a time."""
+    if os.path.exists(path):
+        return path
+    output_dir, name = os.path.split(path)
+    entry = _load(output_dir).get(name)
+    if entry is None:
+        raise FileNotFoundError(path)
+    key = (output_dir, entry.get('source'), entry.get('part'), entry.get('format'))
+    with _guard:
+        held = _locks.setdefault(key, [threading.Lock(), 0])
+        held[1] += 1
+    try:
+        with held[0]:
+            if not os.path.exists(path):
+                with _builds:
+                    if entry['kind'] == 'call':
+                        _build_call(output_dir, name, entry)
+                    else:
+                        _build_mis(output_dir, entry)
+    finally:
+        with _guard:
+            held[1] -= 1
+            if not held[1]:
+                del _locks[key]
+    return path
+
+def _build_call(output_dir, name, entry):
+    with open(os.path.join(output_dir, entry['source']), "rb") as f:
+        func, args = pickle.load(f)
+    tmp_path = os.path.join(output_dir, f"{name}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(func(*args))
+    os.replace(tmp_path, os.path.join(output_dir, name))
+
+def _build_mis(output_dir, entry):
+    fmt = entry['format']
+    names = mis_file_names(entry['stem'], fmt)
+    tmp_paths = {sheet: os.path.join(output_dir, f"{name}.tmp") for sheet, name in names.items()}
+    summary = pd.read_pickle(os.path.join(output_dir, entry['summary'])) if entry['summary'] else None
+
+    chunks = iter_part(os.path.join(output_dir, entry['part']))
+    first = next(chunks, None)
+    if first is None:
+        raise Exception(f"No processed rows recorded for {entry['stem']}")
+    second = next(chunks, None)
+    # Rows streamed in several chunks are written the way the streaming writers do
+    writer = MisWriter(fmt, tmp_paths[None] if fmt == "xlsx" else tmp_paths, widen=second is not None)
+    writer.write(*first)
+    if second is not None:
+        writer.write(*second)
+        for chunk in chunks:
+            writer.write(*chunk)
+    writer.close(summary)
+    for sheet, name in names.items():
+        os.replace(tmp_paths[sheet], os.path.join(output_dir, name))
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+GROSS_SALES_TYPES = ["Purchase", "AUM Trf In", "Switch In", "SIP"]
+NET_SALES_TYPES = ["Purchase", "AUM Trf In", "Switch In", "SIP", "Redemption", "AUM Trf Out", "Switch Out", "SWP"]
+
+
+def derive_columns(txn, desc, trf, net, replace_map, delete_lookup):
+    """Compute the transaction-type and amount columns in one vectorized pass.
+
+    Takes the raw Tran Desc, DescMemo, TrfAmt and Net Amount columns and returns a
+    dict of column name -> array: Revised Trnx Amount, Consider, Delete, Trans Type 2,
+    Gross Sales, Net Sales and Amt in Crs. Each input is coerced exactly once."""
+    txn_clean = txn.astype(str).str.strip()
+    trf_num = pd.to_numeric(trf, errors="coerce").to_numpy()
+    net_num = pd.to_numeric(net, errors="coerce").to_numpy()
+    revised = np.where(trf_num > 1, trf_num, net_num)
+
+    broker_inflow = ((desc.astype(str).str.strip() == "Broker Change") & (txn_clean == "InFlow")).to_numpy()
+    consider = txn_clean.map(replace_map).fillna("").to_numpy(dtype=object)
+    consider[broker_inflow] = "AUM Trf In"
+
+    delete = txn_clean.where(txn_clean.isin(delete_lookup), "").to_numpy(dtype=object)
+
+    consider_s = pd.Series(consider, index=txn.index)
+    gross = consider_s.isin(GROSS_SALES_TYPES).to_numpy()
+    net_sales = consider_s.isin(NET_SALES_TYPES).to_numpy()
+
+    revised_f = revised.astype(float)
+    amt_in_crs = np.where(np.isnan(revised_f), 0, np.where(gross, revised_f / 1e7, -revised_f / 1e7))
+
+    return {
+        "Revised Trnx Amount": revised,
+        "Consider": consider,
+        "Delete": delete,
+        "Trans Type 2": consider.copy(),
+        "Gross Sales": np.where(gross, "Gross Sales", "Redemption"),
+        "Net Sales": np.where(net_sales, "Net Sales", "0"),
+        "Amt in Crs": amt_in_crs,
+    }
@@ -0,0 +1,49 @@
+import importlib.util
+import os
+from io import BytesIO
+
+import pandas as pd
+
+from .utils import normalize_col, read_bytes
+
+ENGINES = ("calamine", "openpyxl")
+
+
+def excel_engine():
+    """Engine for whole-sheet reads: the Rust-backed calamine reader when
+    python-calamine is installed, openpyxl otherwise. TRANSACTION_MIS_EXCEL_ENGINE
+    forces one of ENGINES."""
+    engine = os.environ.get("TRANSACTION_MIS_EXCEL_ENGINE")
+    if engine:
+        if engine not in ENGINES:
+            raise Exception(f"Unknown Excel engine {engine!r}. Expected one of {ENGINES}")
+        return engine
+    return "calamine" if importlib.util.find_spec("python_calamine") is not None else "openpyxl"
+
+def open_workbook(src):
+    """pd.ExcelFile over an uploaded workbook (bytes, file-like object or path)."""
+    return pd.ExcelFile(BytesIO(read_bytes(src)), engine=excel_engine())
+
+def read_sheet(xl, sheet_name=0, header=0, columns=None, dtype=None):
+    """Parse one sheet of an open workbook, keeping only the needed columns.
+
+    columns and the keys of dtype are column names in normalize_col form, so they
+    match whatever case and spacing the sheet's headers use; columns=None keeps every
+    column. Columns given a dtype are converted as they are parsed, e.g. str for
+    codes that must not turn into floats."""
+    if columns is None and not dtype:
+        return xl.parse(sheet_name, header=header)
+    dtype = dtype or {}
+    names = xl.parse(sheet_name, header=header, nrows=0).columns
+
+    def keep(name):
+        return columns is None or normalize_col(name) in columns
+
+    dtypes = {name: dtype[normalize_col(name)] for name in names if keep(name) and normalize_col(name) in dtype}
+    usecols = None if columns is None else keep
+    return xl.parse(sheet_name, header=header, usecols=usecols, dtype=dtypes or None)
+
+def read_excel(src, sheet_name=0, header=0, columns=None, dtype=None):
+    """read_sheet for a single sheet of a workbook that is not open yet."""
+    with open_workbook(src) as xl:
+        return read_sheet(xl, sheet_name, header, columns, dtype)
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+from pandas.util import hash_pandas_object
+
+from .master import LOOKUPS_VERSION
+
+# Bump whenever the tagging, mapping or lookup logic changes what a row enriches to,
+# or how rows are stored, so rows stored by an older version are processed again.
+STORE_VERSION = 2
+
+ROWS_FILE = "rows.parquet"
+# Columns mixing numbers and text (an NTB FY of 2025 next to "FY 25-26") are pickled
+# here instead, so reused rows keep the values a fresh run produces
+MIXED_FILE = "mixed.pkl"
+META_FILE = "meta.json"
+ROW_KEY = "_row_key"
+DEPS_KEY = "_deps"
+
+# Stores are shared by every job (and IncrementalStore instance) that names the same
+# path, so their reads and replacements are serialized per path, not per instance
+_path_locks = {}
+_path_locks_guard = threading.Lock()
+
+
+def _path_lock(path):
+    with _path_locks_guard:
+        return _path_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def _mixed_columns(frame):
+    return [col for col in frame.columns if frame[col].dtype == object and pd.api.types.infer_dtype(frame[col], skipna=True).startswith("mixed")]
+
+
+def row_keys(df):
+    """Stable per-row content key (uint64) over all columns of the transaction frame.
+
+    Identical rows are told apart by their occurrence number, so a file with the same
+    transaction twice keeps two stored rows."""
+    content = hash_pandas_object(df, index=False).to_numpy()
+    occurrence = pd.Series(content).groupby(content).cumcount().to_numpy()
+    return hash_pandas_object(pd.DataFrame({'content': content, 'occurrence': occurrence}), index=False).to_numpy()
+
+def table_row_hashes(table):
+    """uint64 hash of every row of a lookup table, with a trailing 0 for "not found"
+    so a -1 position indexes it."""
+    return np.append(hash_pandas_object(table, index=False).to_numpy(), np.uint64(0))
+
+def combine_hashes(columns):
+    return hash_pandas_object(pd.DataFrame(columns), index=False).to_numpy()
+
+def rules_digest(lookups):
+    """Digest of the lookups that apply to every row alike: the Del Tag rules and the
+    Trnx Type Update replace / delete entries."""
+    payload = json.dumps({
+        'store_version': STORE_VERSION,
+        'lookups_version': LOOKUPS_VERSION,
+        'del_tag_rules': lookups['del_tag_rules'].to_dict("records"),
+        'replace_map': sorted(lookups['replace_map'].items()),
+        'delete_lookup': sorted(lookups['delete_lookup']),
+    }, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class IncrementalStore:
+    """Columnar store of the enriched (derived) columns of already processed rows.
+
+    Each stored row carries its content key (row_keys) and a dependency key: a hash of
+    the master rows its lookups matched and of its Ambit First membership. A later run
+    reuses a stored row only when both keys still match and the rules digest is
+    unchanged, so only new or changed rows, and rows whose master entries changed, go
+    through the pipeline again. Requires pyarrow."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = _path_lock(path)
+
+    def load(self, columns, digest):
+        """Stored rows for a transaction file with these columns, or None when there
+        are none or they were written for other columns, rules or store version."""
+        meta_path = os.path.join(self.path, META_FILE)
+        with self._lock:
+            if not os.path.exists(meta_path):
+                return None
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get('version') != STORE_VERSION or meta.get('columns') != [str(c) for c in columns] or meta.get('digest') != digest:
+                return None
+            rows = pd.read_parquet(os.path.join(self.path, ROWS_FILE))
+            if meta['mixed']:
+                rows = pd.concat([rows, pd.read_pickle(os.path.join(self.path, MIXED_FILE))], axis=1)
+        # Text columns read back from Parquet as pandas strings; give every column
+        # the dtype it was saved with
+        for col, dtype in meta['dtypes'].items():
+            if str(rows[col].dtype) != dtype:
+                rows[col] = rows[col].astype(dtype)
+        return rows[list(meta['dtypes'])]
+
+    def save(self, columns, digest, rows):
+        """Replace the stored rows. rows holds ROW_KEY, DEPS_KEY and the derived
+        columns; load() returns them with the same values and dtypes."""
+        with self._lock:
+            tmp_path = f"{self.path}.tmp{os.getpid()}.{threading.get_ident()}"
+            os.makedirs(tmp_path, exist_ok=True)
+            try:
+                mixed = _mixed_columns(rows)
+                rows.drop(columns=mixed).to_parquet(os.path.join(tmp_path, ROWS_FILE), index=False)
+                if mixed:
+                    rows[mixed].to_pickle(os.path.join(tmp_path, MIXED_FILE))
+                meta = {'version': STORE_VERSION, 'columns': [str(c) for c in columns], 'digest': digest, 'rows': len(rows),
+                        'dtypes': {col: str(rows[col].dtype) for col in rows.columns}, 'mixed': mixed}
+                with open(os.path.join(tmp_path, META_FILE), "w") as f:
+                    json.dump(meta, f)
+                # Moved aside rather than deleted in place, so the rename onto
+                # self.path never meets a directory that is still being removed
+                old_path = f"{tmp_path}.old"
+                if os.path.exists(self.path):
+                    os.replace(self.path, old_path)
+                os.replace(tmp_path, self.path)
+                shutil.rmtree(old_path, ignore_errors=True)
+            finally:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.path, ignore_errors=True)
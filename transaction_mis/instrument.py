@@ -0,0 +1,128 @@
+import cProfile
+import io
+import json
+import pstats
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROFILE_LINES = 40
+
+
+def peak_rss_mb():
+    """High-water mark of this process's resident memory in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB elsewhere
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+def frame_mb(df):
+    return float(df.memory_usage(deep=True).sum()) / 1024 ** 2
+
+
+class RunStats:
+    """Per-stage instrumentation of one pipeline run.
+
+    Each stage records its wall time, how far it pushed the process's peak resident
+    memory, and the rows it took in and produced. A stage entered more than once (one
+    call per chunk when streaming) accumulates. Lookup hit rates are the share of rows
+    whose key was found in each master table. With profile=True, profiling() also
+    captures a cProfile summary of the run. With frame_memory=True, a stage that puts
+    its frame in record['frame'] also records that frame's size (frame_mb, summed
+    over chunks); this walks every string, so it is off by default."""
+
+    def __init__(self, profile=False, frame_memory=False):
+        self.profile = profile
+        self.frame_memory = frame_memory
+        self.stages = {}
+        self.lookups = {}
+        self.info = {}
+        self.profile_text = None
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        record = {'rows_out': None, 'frame': None}
+        peak_before = peak_rss_mb()
+        start = time.perf_counter()
+        yield record
+        seconds = time.perf_counter() - start
+        growth = peak_rss_mb() - peak_before if peak_before is not None else None
+        size = frame_mb(record['frame']) if self.frame_memory and record['frame'] is not None else None
+        self.add_stage(name, seconds, rows_in, record['rows_out'], growth, size)
+
+    def add_stage(self, name, seconds, rows_in=None, rows_out=None, peak_growth_mb=None, frame_mb=None):
+        entry = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'peak_growth_mb': None, 'frame_mb': None, 'rows_in': None, 'rows_out': None})
+        entry['calls'] += 1
+        entry['seconds'] += seconds
+        for key, value in (('rows_in', rows_in), ('rows_out', rows_out), ('peak_growth_mb', peak_growth_mb), ('frame_mb', frame_mb)):
+            if value is not None:
+                entry[key] = (entry[key] or 0) + value
+
+    def count_matches(self, name, matched, rows):
+        entry = self.lookups.setdefault(name, {'matched': 0, 'rows': 0})
+        entry['matched'] += int(matched)
+        entry['rows'] += int(rows)
+
+    @contextmanager
+    def profiling(self):
+        if not self.profile:
+            yield
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this thread
+            self.profile_text = "cProfile unavailable: another profiler is active"
+            yield
+            return
+        try:
+            yield
+        finally:
+            profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+            self.profile_text = out.getvalue()
+
+    def to_dict(self):
+        return {
+            'stages': [{'stage': name, **entry} for name, entry in self.stages.items()],
+            'lookups': {
+                name: {**entry, 'hit_rate': entry['matched'] / entry['rows'] if entry['rows'] else None}
+                for name, entry in self.lookups.items()
+            },
+            'peak_rss_mb': peak_rss_mb(),
+            'info': dict(self.info),
+            'profile': self.profile_text,
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2, default=str)
+
+
+def stage(stats, name, rows_in=None):
+    """stats.stage(...) or, when stats is None, a context that records nothing."""
+    return stats.stage(name, rows_in) if stats is not None else nullcontext({})
+
+def timed_iter(stats, name, iterable):
+    """Yield from iterable, recording the time spent producing each item (a frame) as
+    one call of stage name."""
+    items = iter(iterable)
+    while True:
+        peak_before = peak_rss_mb() if stats is not None else None
+        start = time.perf_counter()
+        try:
+            item = next(items)
+        except StopIteration:
+            return
+        if stats is not None:
+            seconds = time.perf_counter() - start
+            growth = peak_rss_mb() - peak_before if peak_before is not None else None
+            stats.add_stage(name, seconds, None, len(item), growth, frame_mb(item) if stats.frame_memory else None)
+        yield item
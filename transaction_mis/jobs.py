@@ -0,0 +1,130 @@
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    """One submitted pipeline run. progress() is handed to the pipeline as its
+    progress callback, so status, pct and text always reflect the current stage."""
+
+    def __init__(self, job_id, label):
+        self.id = job_id
+        self.label = label
+        self.status = QUEUED
+        self.pct = 0
+        self.text = "⏳ Waiting for a free worker..."
+        self.result = None
+        self.error = None
+        self.traceback = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._future = None
+
+    @property
+    def done(self):
+        return self.status in FINISHED
+
+    def progress(self, pct, text):
+        self.pct = pct
+        self.text = text
+
+
+class JobRunner:
+    """Runs pipeline jobs in the background on a bounded pool of worker threads.
+
+    At most max_workers jobs run at once; further submissions wait in FIFO order, and
+    once max_queued jobs are waiting submit() raises JobQueueFull. Jobs are looked up
+    by id, so a caller can poll one from any thread (or a later browser session).
+    Finished jobs, including their results, are kept for keep_seconds."""
+
+    def __init__(self, max_workers=2, max_queued=20, keep_seconds=3600):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.keep_seconds = keep_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="transaction-mis-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, label="", job_id=None, **kwargs):
+        """Queue func(*args, progress=job.progress, **kwargs); returns the job id
+        (job_id when given, e.g. to match a ResultStore run id)."""
+        with self._lock:
+            self._prune()
+            if sum(job.status == QUEUED for job in self._jobs.values()) >= self.max_queued:
+                raise JobQueueFull(f"{self.max_queued} jobs are already waiting; try again once one finishes")
+            if job_id in self._jobs:
+                raise Exception(f"Job {job_id} already exists")
+            job = Job(job_id or uuid.uuid4().hex, label)
+            self._jobs[job.id] = job
+            job._future = self._pool.submit(self._run, job, func, args, kwargs)
+        return job.id
+
+    def get(self, job_id):
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def queue_position(self, job_id):
+        """1-based place of a queued job in the waiting line, None once it has started."""
+        with self._lock:
+            queued = [jid for jid, job in self._jobs.items() if job.status == QUEUED]
+        return queued.index(job_id) + 1 if job_id in queued else None
+
+    def cancel(self, job_id):
+        """Cancel a job that has not started yet; running jobs cannot be interrupted."""
+        job = self.get(job_id)
+        if job is None or not job._future.cancel():
+            return False
+        job.finished = time.time()
+        job.status = CANCELLED
+        return True
+
+    def discard(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.done:
+                del self._jobs[job_id]
+
+    def jobs(self):
+        with self._lock:
+            self._prune()
+            return list(self._jobs.values())
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job, func, args, kwargs):
+        job.status = RUNNING
+        job.started = time.time()
+        # finished is set before the final status so a done job always has it
+        try:
+            result = func(*args, progress=job.progress, **kwargs)
+        except Exception as e:
+            job.error = str(e)
+            job.traceback = traceback.format_exc()
+            job.finished = time.time()
+            job.status = FAILED
+        else:
+            job.result = result
+            job.finished = time.time()
+            job.status = DONE
+
+    def _prune(self):
+        cutoff = time.time() - self.keep_seconds
+        for job_id in [jid for jid, job in self._jobs.items() if job.done and job.finished < cutoff]:
+            del self._jobs[job_id]
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import take
+
+
+def positions(table_keys, keys):
+    """Row position of each key in a deduplicated lookup table's key column, -1 if absent.
+
+    Matches like a left merge: missing keys (None/NaN) find the table's missing-key row
+    if it has one."""
+    table_keys = pd.Index(table_keys)
+    keys = pd.Index(keys)
+    pos = table_keys.get_indexer(keys)
+    missing = keys.isna()
+    if missing.any():
+        missing_at = np.flatnonzero(table_keys.isna())
+        pos[missing] = missing_at[0] if len(missing_at) else -1
+    return pos
+
+def gather(column, pos):
+    # -1 positions become NaN, as for unmatched rows of a left merge
+    return take(column.array, pos, allow_fill=True)
+
+def matched(table_keys, pos):
+    """Boolean mask of the positions that found a real (non-missing) key."""
+    hit = pos >= 0
+    hit[hit] = pd.notna(np.asarray(table_keys, dtype=object)[pos[hit]])
+    return hit
+
+def encode(values):
+    """values dictionary-encoded once: a Categorical whose categories are the distinct
+    values in order of first appearance, with missing values as code -1."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return pd.Categorical(values)
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    return pd.Categorical.from_codes(codes, uniques)
+
+def map_categories(values, func):
+    """Apply func (Series -> Series) to the distinct values of a Categorical only.
+    Categories that map to the same result are merged."""
+    codes, uniques = pd.factorize(func(pd.Series(values.categories)), use_na_sentinel=True)
+    return pd.Categorical.from_codes(np.append(codes, -1)[values.codes], uniques)
+
+def _with_missing(table_keys, pos):
+    # Trailing slot for missing values (code or position -1), matched like positions() does
+    missing = positions(table_keys, pd.Index([np.nan], dtype=object))
+    return np.append(pos, missing)
+
+def encoded_positions(table_keys, values):
+    """positions() for a Categorical: each category is looked up once and every row
+    takes its category's position."""
+    return _with_missing(table_keys, positions(table_keys, values.categories))[values.codes]
+
+def chained_positions(table_keys, via, pos):
+    """positions(table_keys, gather(via, pos)), resolved once per row of via's table
+    instead of once per transaction."""
+    return _with_missing(table_keys, positions(table_keys, via))[pos]
+
+def gather_encoded(column, pos):
+    """gather() as a Categorical: column is encoded once and rows take its codes."""
+    codes, uniques = pd.factorize(column, use_na_sentinel=True)
+    return pd.Categorical.from_codes(np.append(codes, -1)[pos], uniques)
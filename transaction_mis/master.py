@@ -0,0 +1,126 @@
+import pandas as pd
+
+from .excel import open_workbook, read_sheet
+from .rules import DEL_TAG_RULES_SHEET, default_del_tag_rules, parse_del_tag_rules
+from .utils import normalize_col, read_bytes
+
+# Bump whenever the shape of load_master/build_lookups output changes, so stale
+# on-disk cache entries are not picked up.
+LOOKUPS_VERSION = 5
+
+CLIENT_TARGET_COLUMNS = ['CLIENTID', 'CLIENTNAME', 'CLIENTCODE', 'PANNUMBER', 'GROUPNAME', 'RELMGRNAME', 'BILLGROUP']
+SCHEME_COLUMN_MAPPING = {'SYMBOLID': 'SYMBOLID', 'SYMBOLNAME': 'Scheme name', 'ISINCODE': 'ISIN', 'REFSYMBOL5': 'Symbolcode5', 'DIMNAME15': 'DIMNAME15 Old', 'ASTCLSNAME': 'ASTCLSNAME', 'DIMNAME13': 'DIMNAME13'}
+SCHEME_LOOKUP_COLUMNS = ['DIMNAME15 - New', 'ASTCLSNAME New', 'DIMNAME13', 'Manufacturer Name']
+
+
+def _normalized(names):
+    return {normalize_col(name) for name in names}
+
+# What each sheet role is parsed with: (sheet name, header row, columns, dtypes), with
+# column names in normalize_col form (None keeps every column). Client and Scheme
+# Master keep the columns reconciliation fills in and the lookups read; new rows are
+# appended under their headers (see pipeline.save_master_workbook), so the sheets'
+# other columns never need parsing. Client codes are matched as text only, so they
+# are read as str; SYMBOLID keeps its Excel type because it is matched against the
+# raw Security Code of the transaction file.
+MASTER_SHEETS = {
+    'client': ("Client Master", 0, _normalized(CLIENT_TARGET_COLUMNS), {'clientcode': str}),
+    'scheme': ("Scheme Master", 1, _normalized([*SCHEME_COLUMN_MAPPING.values(), *SCHEME_LOOKUP_COLUMNS]), None),
+    'ambit_first': ("Ambit First", 0, {'clientcode'}, {'clientcode': str}),
+    'trnx_type': ("Trnx Type Update", 0, None, None),
+    'employee': ("Employee Mapping Master", 0, {'bankername', 'bankernamenew', 'bankergroupname', 'grouptag'}, None),
+    'ntb': ("NTB Data", 0, {'familyname', 'month', 'fy'}, None),
+}
+# The System Client and Scheme Masters only contribute the columns reconciliation maps
+SYSTEM_SHEETS = {
+    'client': (0, 0, _normalized(CLIENT_TARGET_COLUMNS), None),
+    'scheme': (0, 0, _normalized(SCHEME_COLUMN_MAPPING), None),
+}
+
+
+def load_master(master_file):
+    """Parse every MASTER sheet the pipeline needs from a single open of the workbook.
+
+    Returns a dict of DataFrames keyed by sheet role, each holding only the columns
+    listed for it in MASTER_SHEETS. The Scheme Master header sits on the sheet's
+    second row."""
+    with open_workbook(read_bytes(master_file)) as xl:
+        master = {role: read_sheet(xl, *spec) for role, spec in MASTER_SHEETS.items()}
+        # Optional: overrides the built-in Del Tag rules when present
+        master['del_tag_rules'] = xl.parse(DEL_TAG_RULES_SHEET) if DEL_TAG_RULES_SHEET in xl.sheet_names else None
+    return master
+
+def clean_codes(values):
+    """Client and WS account codes as match keys: stripped text without the ".0"
+    float formatting leaves. Every side of a code match (WS file, Client Master,
+    Ambit First, System Client Master) goes through this, whatever dtype it was read
+    with, so a code like "AB.01" is cleaned the same way everywhere."""
+    return values.astype(str).str.strip().str.replace(".0", "", regex=False)
+
+def as_saved(df):
+    # Blank cells come back as NaN once the master is written to xlsx and read again;
+    # lookups built from the in-memory frames must see the same values.
+    return df.replace("", float("nan"))
+
+def build_lookups(master):
+    """Build the deduplicated lookup structures the tagging and lookup stages use.
+
+    Everything here depends only on the (reconciled) master, so the result can be
+    shared read-only across transaction files and cached between runs."""
+    ambit_first = master['ambit_first'].copy()
+    ambit_first.columns = ambit_first.columns.astype(str).str.strip().str.lower().str.replace(" ", "_")
+    ambit_first["_client_clean"] = clean_codes(ambit_first["clientcode"])
+    ambit_first = ambit_first.drop_duplicates(subset=["_client_clean"])
+    ambit_set = set(ambit_first["_client_clean"])
+
+    tt = master['trnx_type'].copy()
+    tt.columns = [str(c).strip() for c in tt.columns]
+    tran_desc_col = tt.columns[0]
+    replace_col = tt.columns[1] if len(tt.columns) > 1 else None
+    delete_col = tt.columns[4] if len(tt.columns) > 4 else None
+    tt = tt.drop_duplicates(subset=[tran_desc_col])
+
+    replace_map = {}
+    if replace_col:
+        replace_map = dict(zip(tt[tran_desc_col].astype(str).str.strip(), tt[replace_col].astype(str).str.strip()))
+
+    delete_lookup = set()
+    if delete_col:
+        delete_lookup = set(tt[delete_col].dropna().astype(str).str.strip())
+
+    scheme = as_saved(master['scheme'])
+    scheme.columns = scheme.columns.str.lower().str.strip()
+    scheme = scheme.drop_duplicates(subset=["symbolid"])
+    scheme = scheme[["symbolid", "dimname15 - new", "astclsname new", "dimname13", "manufacturer name"]].reset_index(drop=True)
+
+    client = as_saved(master['client'])
+    client.columns = client.columns.str.lower().str.strip().str.replace(" ", "_")
+    client["_client_clean"] = clean_codes(client["clientcode"]).str.upper()
+    client = client.drop_duplicates(subset=["_client_clean"], keep="last")
+    client = client[["_client_clean", "groupname", "pannumber", "relmgrname"]].reset_index(drop=True)
+
+    emp = master['employee'].copy()
+    emp.columns = emp.columns.str.lower().str.strip().str.replace(" ", "_")
+    emp = emp.drop_duplicates(subset=["banker_name"])
+    emp = emp[["banker_name", "banker_name_new", "banker_group_name", "group_tag"]].reset_index(drop=True)
+
+    ntb = master['ntb'].copy()
+    ntb.columns = ntb.columns.str.lower().str.strip().str.replace(" ", "_")
+    ntb = ntb.drop_duplicates(subset=["family_name"])
+    ntb = ntb[["family_name", "month", "fy"]].reset_index(drop=True)
+
+    if master.get('del_tag_rules') is not None:
+        del_tag_rules = parse_del_tag_rules(master['del_tag_rules'])
+    else:
+        del_tag_rules = default_del_tag_rules()
+
+    return {
+        'ambit_set': ambit_set,
+        'del_tag_rules': del_tag_rules,
+        'replace_map': replace_map,
+        'delete_lookup': delete_lookup,
+        'scheme': scheme,
+        'client': client,
+        'employee': emp,
+        'ntb': ntb,
+    }
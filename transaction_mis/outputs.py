@@ -0,0 +1,299 @@
+import io
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+
+OUTPUT_FORMATS = ("xlsx", "parquet", "csv")
+MIS_SHEETS = ("Raw Dump", "Working", "Final")
+# xlsx workbooks also get the run's aggregate (see pipeline.summarize) as a last sheet
+SUMMARY_SHEET = "Summary"
+
+# Rows are converted and written this many at a time, which bounds the memory the
+# writers need on top of the frame itself.
+WRITE_CHUNK_ROWS = 50_000
+
+_thin = Side(style="thin")
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(left=_thin, right=_thin, top=_thin, bottom=_thin)
+HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="top")
+
+
+def mis_sheets(df, working_mask, final_mask):
+    # Working and Final are row masks over the Raw Dump, never copied subsets
+    return [("Raw Dump", None), ("Working", working_mask), ("Final", final_mask)]
+
+def mis_file_names(stem, fmt):
+    """Output file name per sheet (xlsx keeps all sheets in one workbook)."""
+    if fmt == "xlsx":
+        return {None: f"{stem}.xlsx"}
+    return {sheet: f"{stem}_{sheet.replace(' ', '_')}.{fmt}" for sheet in MIS_SHEETS}
+
+def iter_chunks(df, mask=None, chunk_rows=WRITE_CHUNK_ROWS):
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows]
+        if mask is not None:
+            chunk = chunk[mask[start:start + chunk_rows]]
+        if len(chunk):
+            yield chunk
+
+
+def _header_row(ws, columns):
+    row = []
+    for name in columns:
+        cell = WriteOnlyCell(ws, value=str(name))
+        cell.font = HEADER_FONT
+        cell.border = HEADER_BORDER
+        cell.alignment = HEADER_ALIGNMENT
+        row.append(cell)
+    return row
+
+def _open_text(target):
+    if isinstance(target, (str, os.PathLike)):
+        return open(target, "w", newline="", encoding="utf-8")
+    return io.TextIOWrapper(target, encoding="utf-8", newline="", write_through=True)
+
+def _close_text(handle, target):
+    if isinstance(handle, io.TextIOWrapper) and handle.buffer is target:
+        handle.detach()
+    else:
+        handle.close()
+
+
+_ARROW_TYPES = {
+    "string": "string", "empty": "string", "bytes": "binary",
+    "integer": "int64", "floating": "float64", "mixed-integer-float": "float64", "decimal": "float64",
+    "boolean": "bool", "date": "date32", "datetime": "timestamp[ns]", "datetime64": "timestamp[ns]",
+}
+
+def _present_categories(s):
+    # The categories a categorical column actually uses; its full category set can
+    # hold values (from the rest of the file, or the master) this frame never has
+    codes = s.cat.codes.to_numpy()
+    return s.cat.categories[np.unique(codes[codes >= 0])]
+
+def parquet_schema(df, widen=False):
+    """The pyarrow schema df is written to Parquet with (see arrow_table).
+
+    widen: the frame is only the first of several chunks, so integer columns are
+    written as float64 in case a later chunk has missing values."""
+    import pyarrow as pa
+
+    fields = []
+    for col in df.columns:
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            # Categoricals (compact mode) are written as plain columns of their values,
+            # typed by the values present, as the column would be without compact mode
+            s = pd.Series(_present_categories(s), name=col)
+        if s.dtype == object:
+            kind = _ARROW_TYPES.get(pd.api.types.infer_dtype(s, skipna=True))
+            if kind is None or (widen and kind == "empty"):
+                # Mixed-type object columns are written as text
+                kind = "string"
+            if widen and kind == "int64":
+                kind = "float64"
+            fields.append(pa.field(str(col), pa.type_for_alias(kind)))
+        else:
+            field = pa.Schema.from_pandas(s.iloc[:0].to_frame(), preserve_index=False).field(0).with_name(str(col))
+            if widen and pa.types.is_integer(field.type):
+                field = field.with_type(pa.float64())
+            fields.append(field)
+    return pa.schema(fields)
+
+def merge_schemas(schemas):
+    """One Parquet schema for frames written into the same file (the same columns,
+    each schema from parquet_schema): fields that disagree become float64 when
+    all of them are numeric and string otherwise."""
+    import pyarrow as pa
+
+    schemas = list(schemas)
+    fields = []
+    for i, field in enumerate(schemas[0]):
+        types = {schema.field(i).type for schema in schemas}
+        if len(types) > 1:
+            numeric = all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in types)
+            field = field.with_type(pa.float64() if numeric else pa.string())
+        fields.append(field)
+    return pa.schema(fields)
+
+def _value_kind(s):
+    # infer_dtype only scans object values; typed columns are answered from the dtype
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        s = _present_categories(s)
+    return pd.api.types.infer_dtype(s, skipna=True)
+
+def arrow_table(df, schema):
+    """df as a pyarrow Table of schema (see parquet_schema).
+
+    The schema may have been taken from an earlier chunk of the same output, so
+    each column is made to fit its field: anything other than text in a string
+    field (mixed-type columns, or codes that were text in the first chunk and are
+    numbers in this one) is written as text. Text in a numeric field cannot be
+    written and raises."""
+    import pyarrow as pa
+
+    converted = {}
+    for col, field in zip(df.columns, schema):
+        kind = _value_kind(df[col])
+        if pa.types.is_string(field.type) or pa.types.is_large_string(field.type):
+            if kind not in ("string", "empty"):
+                converted[col] = df[col].map(lambda v: v if pd.isna(v) else str(v))
+        elif (pa.types.is_integer(field.type) or pa.types.is_floating(field.type)) and kind not in ("integer", "floating", "mixed-integer-float", "decimal", "empty"):
+            raise Exception(f"Column {col!r} has text values that do not fit its {field.type} Parquet column, whose type was set by the first chunk written; write this file without chunking")
+    if converted:
+        df = df.copy()
+        for col, values in converted.items():
+            df[col] = values
+    df = df.set_axis([str(c) for c in df.columns], axis=1)
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+class MisWriter:
+    """Incremental writer for the Raw Dump / Working / Final outputs in one format.
+
+    write() may be called once with the whole frame or repeatedly with consecutive
+    chunks of it (same columns each time); Working and Final are given as row masks.
+    For xlsx target is a single path or binary file object; for csv and parquet it is
+    a dict of sheet name -> path or file object (see mis_file_names). Rows go out in
+    WRITE_CHUNK_ROWS slices, so memory does not grow with the number of rows written.
+    A summary frame given to close() becomes the workbook's SUMMARY_SHEET; csv and
+    Parquet outputs hold the rows only. schema fixes the Parquet schema up front
+    instead of taking it from the first frame written."""
+
+    def __init__(self, fmt, target, widen=False, schema=None):
+        if fmt not in OUTPUT_FORMATS:
+            raise Exception(f"Unknown output format {fmt!r}. Expected one of {OUTPUT_FORMATS}")
+        self.fmt = fmt
+        self.target = target
+        self.widen = widen
+        self._schema = schema
+        self._sheets = None
+        self._columns = None
+
+    def write(self, df, working_mask, final_mask):
+        if self._sheets is None:
+            self._open(df)
+        sheets = mis_sheets(df, np.asarray(working_mask), np.asarray(final_mask))
+        for (sheet_name, mask), sink in zip(sheets, self._sheets):
+            for chunk in iter_chunks(df, mask):
+                getattr(self, f"_write_{self.fmt}")(sink, chunk)
+
+    def close(self, summary=None):
+        if self._sheets is None:
+            raise Exception("MisWriter closed before anything was written")
+        if self.fmt == "xlsx":
+            if summary is not None:
+                ws = self._wb.create_sheet(SUMMARY_SHEET)
+                ws.append(_header_row(ws, summary.columns))
+                self._write_xlsx(ws, summary)
+            self._wb.save(self.target)
+        elif self.fmt == "csv":
+            for (handle, _), sheet_name in zip(self._sheets, MIS_SHEETS):
+                _close_text(handle, self.target[sheet_name])
+        else:
+            for writer in self._sheets:
+                writer.close()
+
+    def _open(self, df):
+        self._columns = list(df.columns)
+        if self.fmt == "xlsx":
+            self._wb = Workbook(write_only=True)
+            self._sheets = []
+            for sheet_name in MIS_SHEETS:
+                ws = self._wb.create_sheet(sheet_name)
+                ws.append(_header_row(ws, self._columns))
+                self._sheets.append(ws)
+        elif self.fmt == "csv":
+            self._sheets = []
+            for sheet_name in MIS_SHEETS:
+                handle = _open_text(self.target[sheet_name])
+                df.iloc[:0].to_csv(handle, index=False)
+                self._sheets.append((handle, sheet_name))
+        else:
+            import pyarrow.parquet as pq
+
+            if self._schema is None:
+                self._schema = parquet_schema(df, widen=self.widen)
+            self._sheets = [pq.ParquetWriter(self.target[sheet_name], self._schema) for sheet_name in MIS_SHEETS]
+
+    def _write_xlsx(self, ws, chunk):
+        values = chunk.astype(object).to_numpy()
+        values[pd.isna(values)] = None
+        for row in values.tolist():
+            ws.append(row)
+
+    def _write_csv(self, sink, chunk):
+        chunk.to_csv(sink[0], index=False, header=False)
+
+    def _write_parquet(self, writer, chunk):
+        writer.write_table(arrow_table(chunk, self._schema))
+
+
+class FramePart:
+    """MisWriter-like sink that pickles every written frame with its Working and Final
+    masks into one file, so a worker process can hand its processed rows to the
+    parent for the combined MIS without sending them back in memory, or a run can
+    keep its rows until an output is asked for (see deferred)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.columns = None
+        self._file = open(path, "wb")
+
+    def write(self, df, working_mask, final_mask):
+        if self.columns is None:
+            self.columns = list(df.columns)
+        pickle.dump((df, np.asarray(working_mask), np.asarray(final_mask)), self._file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def close(self):
+        self._file.close()
+
+def iter_part(path):
+    with open(path, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def mis_targets(formats, stem, output_dir=None):
+    """Per-format write targets plus {file name: path or BytesIO}.
+
+    Files go into output_dir when given, otherwise into BytesIO buffers."""
+    targets = {}
+    files = {}
+    for fmt in formats:
+        names = mis_file_names(stem, fmt)
+        sinks = {sheet: os.path.join(output_dir, name) if output_dir is not None else io.BytesIO() for sheet, name in names.items()}
+        targets[fmt] = sinks[None] if fmt == "xlsx" else sinks
+        files.update({name: sinks[sheet] for sheet, name in names.items()})
+    return targets, files
+
+def collect_outputs(files):
+    return {name: sink.getvalue() if isinstance(sink, io.BytesIO) else sink for name, sink in files.items()}
+
+def write_mis(df, working_mask, final_mask, fmt, target, summary=None):
+    """Write the Raw Dump / Working / Final outputs of a complete frame in one format."""
+    writer = MisWriter(fmt, target)
+    writer.write(df, working_mask, final_mask)
+    writer.close(summary)
+
+def write_mis_files(df, working_mask, final_mask, formats, output_dir, stem, summary=None):
+    """Write each requested format into output_dir; returns {file name: path}."""
+    targets, files = mis_targets(formats, stem, output_dir)
+    for fmt in formats:
+        write_mis(df, working_mask, final_mask, fmt, targets[fmt], summary)
+    return files
+
+def write_mis_bytes(df, working_mask, final_mask, formats, stem, summary=None):
+    """In-memory counterpart of write_mis_files; returns {file name: bytes}."""
+    targets, files = mis_targets(formats, stem)
+    for fmt in formats:
+        write_mis(df, working_mask, final_mask, fmt, targets[fmt], summary)
+    return collect_outputs(files)
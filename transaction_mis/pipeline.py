@@ -0,0 +1,729 @@
+import os
+import time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from .cache import content_key
+from .derived import derive_columns
+from .incremental import DEPS_KEY, ROW_KEY, combine_hashes, row_keys, rules_digest, table_row_hashes
+from .instrument import RunStats, frame_mb, stage, timed_iter
+from .joins import chained_positions, encode, encoded_positions, gather, gather_encoded, map_categories, matched, positions
+from .deferred import defer_call, defer_mis
+from .outputs import FramePart, MisWriter, collect_outputs, mis_targets, write_mis_files, write_mis_bytes
+from .reader import PARSE_LABELS, header_names, iter_parsed, load_transactions, open_transaction_chunks, transaction_columns
+from .master import CLIENT_TARGET_COLUMNS, LOOKUPS_VERSION, SCHEME_COLUMN_MAPPING, build_lookups, clean_codes
+from .rules import classify_del_tags
+from .utils import normalize_col, strip_time_from_dates, read_bytes
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+MIS_STEM = "Transaction_MIS_Final"
+MASTER_FILE_NAME = "Updated_Master_File.xlsx"
+
+DERIVED_COLUMNS = ["Revised Trnx Amount", "Consider", "Delete", "Trans Type 2", "Gross Sales", "Net Sales", "Product New", "Asset Class New", "Product Category New", "Manufacturer Name New", "Banker Name", "Banker Name New", "Banker Group Name", "Banker Group Tag", "Amt in Crs", "Family Name as per Client Master", "Family Name Final", "Pk Remark", "Extra column", "Month-New", "YTD Tag", "Ambit First", "Pan No", "Month-New For Banker MIS", "NTB Month", "NTB FY", "Length", "Del Tag"]
+
+
+def _no_progress(pct, text):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Stage 1: master reconciliation
+# ---------------------------------------------------------------------------
+
+def reconcile_client_master(system_client, master_client):
+    system_client_normalized = {normalize_col(c): c for c in system_client.columns}
+
+    system_matched_cols = {}
+    for target_col in CLIENT_TARGET_COLUMNS:
+        if normalize_col(target_col) in system_client_normalized:
+            system_matched_cols[target_col] = system_client_normalized[normalize_col(target_col)]
+
+    if system_matched_cols:
+        system_client_filtered = system_client[list(system_matched_cols.values())].copy()
+        system_client_filtered.columns = list(system_matched_cols.keys())
+    else:
+        raise Exception("No matching columns in System Client Master!")
+
+    system_client_filtered['_clientcode_clean'] = clean_codes(system_client_filtered['CLIENTCODE']).str.upper()
+    master_client = master_client.copy()
+    master_client['_clientcode_clean'] = clean_codes(master_client['CLIENTCODE']).str.upper()
+
+    master_clientcodes = set(master_client['_clientcode_clean'].unique())
+    system_clientcodes = set(system_client_filtered['_clientcode_clean'].unique())
+    missing_clientcodes = system_clientcodes - master_clientcodes
+
+    if len(missing_clientcodes) > 0:
+        missing_records = system_client_filtered[system_client_filtered['_clientcode_clean'].isin(missing_clientcodes)].copy().drop(columns=['_clientcode_clean'])
+        master_columns = [col for col in master_client.columns if col != '_clientcode_clean']
+        master_col_normalized = {normalize_col(c): c for c in master_columns}
+
+        missing_records_mapped = pd.DataFrame()
+        for std_col in missing_records.columns:
+            if normalize_col(std_col) in master_col_normalized:
+                master_col_name = master_col_normalized[normalize_col(std_col)]
+                missing_records_mapped[master_col_name] = missing_records[std_col]
+
+        for col in master_columns:
+            if col not in missing_records_mapped.columns:
+                missing_records_mapped[col] = ""
+
+        missing_records_mapped = missing_records_mapped[master_columns]
+        master_client_updated = pd.concat([master_client.drop(columns=['_clientcode_clean']), missing_records_mapped], ignore_index=True)
+    else:
+        master_client_updated = master_client.drop(columns=['_clientcode_clean'])
+        missing_records_mapped = master_client_updated.iloc[:0]
+
+    return master_client_updated, missing_clientcodes, missing_records_mapped
+
+def reconcile_scheme_master(system_scheme, master_scheme):
+    system_scheme_normalized = {normalize_col(c): c for c in system_scheme.columns}
+    system_scheme_matched_cols = {}
+
+    for system_col, master_col in SCHEME_COLUMN_MAPPING.items():
+        if normalize_col(system_col) in system_scheme_normalized:
+            system_scheme_matched_cols[master_col] = system_scheme_normalized[normalize_col(system_col)]
+
+    if system_scheme_matched_cols:
+        system_scheme_filtered = system_scheme[list(system_scheme_matched_cols.values())].copy()
+        system_scheme_filtered.columns = list(system_scheme_matched_cols.keys())
+    else:
+        raise Exception("No matching columns in System Scheme Master!")
+
+    system_scheme_filtered['_symbolid_clean'] = system_scheme_filtered['SYMBOLID'].astype(str).str.strip().str.upper()
+    master_scheme = master_scheme.copy()
+    master_scheme['_symbolid_clean'] = master_scheme['SYMBOLID'].astype(str).str.strip().str.upper()
+
+    master_symbolids = set(master_scheme['_symbolid_clean'].unique())
+    system_symbolids = set(system_scheme_filtered['_symbolid_clean'].unique())
+    missing_symbolids = system_symbolids - master_symbolids
+
+    if len(missing_symbolids) > 0:
+        missing_scheme_records = system_scheme_filtered[system_scheme_filtered['_symbolid_clean'].isin(missing_symbolids)].copy().drop(columns=['_symbolid_clean'])
+        missing_scheme_records['DIMNAME15 - New'] = ""
+        missing_scheme_records['ASTCLSNAME New'] = ""
+        missing_scheme_records['Manufacturer Name'] = ""
+
+        master_scheme_columns = [col for col in master_scheme.columns if col != '_symbolid_clean']
+        for col in master_scheme_columns:
+            if col not in missing_scheme_records.columns:
+                missing_scheme_records[col] = ""
+
+        missing_scheme_records = missing_scheme_records[master_scheme_columns]
+        master_scheme_updated = pd.concat([master_scheme.drop(columns=['_symbolid_clean']), missing_scheme_records], ignore_index=True)
+    else:
+        master_scheme_updated = master_scheme.drop(columns=['_symbolid_clean'])
+        missing_scheme_records = master_scheme_updated.iloc[:0]
+
+    return master_scheme_updated, missing_symbolids, missing_scheme_records
+
+def _last_used_row(ws, header_row):
+    # max_row can include trailing rows that only carry formatting
+    row = ws.max_row
+    while row > header_row and all(v is None for v in next(ws.iter_rows(min_row=row, max_row=row, values_only=True))):
+        row -= 1
+    return row
+
+def _append_rows(ws, rows, header_row):
+    # The master sheets are parsed with only the columns the pipeline needs, so each
+    # frame column is placed under the sheet column with its (pandas-named) header;
+    # existing rows and formatting are left untouched.
+    header = next(ws.iter_rows(min_row=header_row, max_row=header_row, values_only=True), ())
+    sheet_cols = {name: i for i, name in enumerate(header_names(header), start=1)}
+    missing = [col for col in rows.columns if col not in sheet_cols]
+    if missing:
+        raise Exception(f"Columns {missing} not found in the {ws.title} sheet header")
+    cols = [sheet_cols[col] for col in rows.columns]
+    start = _last_used_row(ws, header_row) + 1
+    for offset, values in enumerate(rows.astype(object).to_numpy().tolist()):
+        for col, value in zip(cols, values):
+            if value is None or value == "" or (isinstance(value, float) and np.isnan(value)):
+                continue
+            ws.cell(row=start + offset, column=col, value=value)
+
+def save_master_workbook(master_bytes, new_client_rows, new_scheme_rows):
+    """Append the reconciled Client and Scheme Master rows to the original workbook.
+
+    Only the new rows are written, below the existing data of each sheet. When
+    nothing is missing the uploaded bytes are returned as they are."""
+    if new_client_rows.empty and new_scheme_rows.empty:
+        return master_bytes
+
+    wb = load_workbook(BytesIO(master_bytes))
+    if not new_client_rows.empty:
+        _append_rows(wb["Client Master"], new_client_rows, header_row=1)
+    if not new_scheme_rows.empty:
+        _append_rows(wb["Scheme Master"], new_scheme_rows, header_row=2)
+
+    master_output = BytesIO()
+    wb.save(master_output)
+    return master_output.getvalue()
+
+def _prepare_inputs(sources, progress=_no_progress, cache=None, workers=None, stats=None):
+    # sources: {kind: file} with 'client', 'scheme', 'master' and optionally 'txn'.
+    # All needed workbooks are parsed concurrently (see reader.iter_parsed); each master
+    # is reconciled as soon as it and the MASTER are available.
+    progress(0, "📂 Loading files...")
+    data = {kind: read_bytes(src) for kind, src in sources.items()}
+
+    reconciled_key = f"reconciled-v{LOOKUPS_VERSION}-{content_key(data['master'], data['client'], data['scheme'])}"
+    reconciled = cache.get(reconciled_key) if cache is not None else None
+    if stats is not None and cache is not None:
+        stats.info['reconciled_cache'] = "hit" if reconciled is not None else "miss"
+
+    jobs = {}
+    master = None
+    if reconciled is None:
+        master_key = f"master-v{LOOKUPS_VERSION}-{content_key(data['master'])}"
+        master = cache.get(master_key) if cache is not None else None
+        if stats is not None and cache is not None:
+            stats.info['master_cache'] = "hit" if master is not None else "miss"
+        jobs = {kind: data[kind] for kind in ('client', 'scheme') if kind in data}
+        if master is None:
+            jobs['master'] = data['master']
+        else:
+            # Shallow copy: reconciliation swaps in new frames and must not touch the cached model
+            master = dict(master)
+    if 'txn' in data:
+        jobs['txn'] = data['txn']
+
+    parsed = {}
+    missing_clientcodes = missing_symbolids = new_client_rows = new_scheme_rows = None
+    for done, (kind, result, seconds) in enumerate(iter_parsed(jobs, workers), 1):
+        progress(int(30 * done / len(jobs)), f"✅ Parsed {PARSE_LABELS[kind]}")
+        if stats is not None:
+            rows = None if kind == 'master' else len(result[0] if kind == 'txn' else result)
+            size = frame_mb(result[0]) if kind == 'txn' and stats.frame_memory else None
+            stats.add_stage(f"parse_{kind}", seconds, rows_out=rows, frame_mb=size)
+        if kind == 'master':
+            if cache is not None:
+                cache.put(master_key, result)
+            master = dict(result)
+        else:
+            parsed[kind] = result
+        if master is None:
+            continue
+        if missing_clientcodes is None and 'client' in parsed:
+            progress(int(30 * done / len(jobs)), "👥 Updating Client Master...")
+            system_client = parsed.pop('client')
+            with stage(stats, "reconcile_client_master", len(system_client)) as record:
+                master['client'], missing_clientcodes, new_client_rows = reconcile_client_master(system_client, master['client'])
+                record['rows_out'] = len(master['client'])
+        if missing_symbolids is None and 'scheme' in parsed:
+            progress(int(30 * done / len(jobs)), "📊 Updating Scheme Master...")
+            system_scheme = parsed.pop('scheme')
+            with stage(stats, "reconcile_scheme_master", len(system_scheme)) as record:
+                master['scheme'], missing_symbolids, new_scheme_rows = reconcile_scheme_master(system_scheme, master['scheme'])
+                record['rows_out'] = len(master['scheme'])
+
+    if reconciled is None:
+        with stage(stats, "build_lookups"):
+            lookups = build_lookups(master)
+        reconciled = {
+            'master': master,
+            'lookups': lookups,
+            'new_client_rows': new_client_rows,
+            'new_scheme_rows': new_scheme_rows,
+            'new_clients': len(missing_clientcodes),
+            'new_schemes': len(missing_symbolids),
+        }
+        if cache is not None:
+            cache.put(reconciled_key, reconciled)
+    progress(35, "📚 Lookups ready")
+    return {**reconciled, 'master_bytes': data['master']}, parsed.get('txn')
+
+def reconcile_masters(system_client_file, system_scheme_file, master_file, progress=_no_progress, cache=None, workers=None):
+    """Parse the MASTER once, add missing clients/schemes to its in-memory model and
+    build the lookup indexes from it.
+
+    The three workbooks are parsed concurrently. The returned 'lookups' feed
+    process_transactions directly; the workbook itself is only touched by
+    save_master_workbook, which appends 'new_client_rows' / 'new_scheme_rows'. With a
+    MasterCache, a repeat run on the same three files skips all of this, and a new pair
+    of system masters against a known MASTER still skips parsing it."""
+    sources = {'client': system_client_file, 'scheme': system_scheme_file, 'master': master_file}
+    reconciled, _ = _prepare_inputs(sources, progress, cache, workers)
+    return reconciled
+
+
+# ---------------------------------------------------------------------------
+# Stage 2: Ambit First and Del tagging
+# ---------------------------------------------------------------------------
+
+# Text columns that compact mode keeps as categoricals (all derived columns but the amounts and Length)
+COMPACT_COLUMNS = [col for col in DERIVED_COLUMNS if col not in ("Revised Trnx Amount", "Amt in Crs", "Length")]
+# Compact mode also encodes transaction text columns with at most this share of distinct values
+COMPACT_MAX_DISTINCT = 0.5
+
+def compact_frame(df, columns=None):
+    """Dictionary-encode text columns as categoricals, in place.
+
+    columns=None picks the transaction file's own text columns with few enough
+    distinct values (see COMPACT_MAX_DISTINCT); the MIS writers, Parquet schema and
+    incremental store all read categoricals as their plain values."""
+    if columns is None:
+        limit = COMPACT_MAX_DISTINCT * len(df)
+        columns = [col for col in df.columns if (df[col].dtype == object or pd.api.types.is_string_dtype(df[col].dtype)) and df[col].nunique() <= limit]
+    for col in columns:
+        df[col] = encode(df[col])
+    return df
+
+def ws_keys(values):
+    """WS account codes cleaned like the master codes (see master.clean_codes) and
+    dictionary-encoded, so each distinct code is cleaned once and every key stage
+    shares the encoding."""
+    return map_categories(encode(values), clean_codes)
+
+def tag_ambit_first(df, cols, lookups, compact=False):
+    ws_col = cols['ws']
+    df["Length"] = df[ws_col].astype(str).str.len()
+    df["Del Tag"] = ""
+    df["Ambit First"] = ""
+
+    # Key columns are encoded once here; Del tagging and the lookups reuse them
+    df["_ws"] = ws_keys(df[ws_col])
+    df["_sec"] = encode(df[cols['sec']])
+    matches = df["_ws"].array.isin(lookups['ambit_set'])
+    df.loc[matches, "Ambit First"] = "Ambit First"
+    if compact:
+        compact_frame(df, ["Ambit First"])
+    return df
+
+def tag_del(df, cols, lookups, compact=False):
+    df = classify_del_tags(df, cols, lookups['del_tag_rules'])
+    if compact:
+        compact_frame(df, ["Del Tag"])
+    return df
+
+
+# ---------------------------------------------------------------------------
+# Stage 3: transaction-type mapping
+# ---------------------------------------------------------------------------
+
+def map_transaction_types(df, cols, lookups, compact=False):
+    derived = derive_columns(df[cols['txn']], df[cols['desc']], df[cols['trf']], df[cols['net']], lookups['replace_map'], lookups['delete_lookup'])
+    for name, values in derived.items():
+        df[name] = encode(pd.Series(values)) if compact and name in COMPACT_COLUMNS else values
+    return df
+
+
+# ---------------------------------------------------------------------------
+# Stage 4: scheme, client, employee and NTB lookups
+# ---------------------------------------------------------------------------
+
+AMBIT_FIRST_PRODUCT = {"Product New": "GPC - PMS", "Asset Class New": "Other NDPMS", "Product Category New": "Equity PMS", "Manufacturer Name New": "GPC - Ambit First"}
+LOOKUP_KEYS = {'scheme': "symbolid", 'client': "_client_clean", 'employee': "banker_name", 'ntb': "family_name"}
+
+def lookup_positions(sec, ws, lookups):
+    """Row position of every transaction in the scheme, client, employee and NTB
+    tables (-1 where absent), keyed like LOOKUP_KEYS. sec and ws are the encoded
+    Security and WS account codes (see tag_ambit_first), so each distinct code is
+    looked up once; employee and NTB go through the client's banker and family, which
+    are resolved once per client table row."""
+    client = lookups['client']
+    client_pos = encoded_positions(client["_client_clean"], map_categories(ws, lambda codes: codes.str.upper()))
+    return {
+        'scheme': encoded_positions(lookups['scheme']["symbolid"], sec),
+        'client': client_pos,
+        'employee': chained_positions(lookups['employee']["banker_name"], client["relmgrname"], client_pos),
+        'ntb': chained_positions(lookups['ntb']["family_name"], client["groupname"], client_pos),
+    }
+
+def apply_lookups(df, cols, lookups, stats=None, compact=False):
+    """Scheme, client, employee and NTB lookups as one join stage.
+
+    Each key is resolved to a row position in its deduplicated master table; the
+    chained lookups (client -> banker -> employee, client -> family -> NTB) go through
+    the client table. Only the output columns are gathered and attached to df in
+    place, so the wide transaction frame is never copied; in compact mode they are
+    gathered as categoricals. With stats, the share of rows found in each master table
+    is counted."""
+    scheme, client, emp, ntb = lookups['scheme'], lookups['client'], lookups['employee'], lookups['ntb']
+    take = gather_encoded if compact else gather
+
+    pos = lookup_positions(df["_sec"].array, df["_ws"].array, lookups)
+    scheme_pos, client_pos, emp_pos, ntb_pos = pos['scheme'], pos['client'], pos['employee'], pos['ntb']
+    if stats is not None:
+        for name, key in LOOKUP_KEYS.items():
+            stats.count_matches(name, matched(lookups[name][key], pos[name]).sum(), len(pos[name]))
+
+    out = {
+        "Product New": take(scheme["dimname15 - new"], scheme_pos),
+        "Asset Class New": take(scheme["astclsname new"], scheme_pos),
+        "Product Category New": take(scheme["dimname13"], scheme_pos),
+        "Manufacturer Name New": take(scheme["manufacturer name"], scheme_pos),
+        "Family Name as per Client Master": take(client["groupname"], client_pos),
+        "Pan No": take(client["pannumber"], client_pos),
+        "Banker Name": take(client["relmgrname"], client_pos),
+        "Banker Name New": take(emp["banker_name_new"], emp_pos),
+        "Banker Group Name": take(emp["banker_group_name"], emp_pos),
+        "Banker Group Tag": take(emp["group_tag"], emp_pos),
+        "NTB Month": take(ntb["month"], ntb_pos),
+        "NTB FY": take(ntb["fy"], ntb_pos),
+    }
+
+    ambit_first_mask = (df["Ambit First"] == "Ambit First").to_numpy()
+    if ambit_first_mask.any():
+        for col, value in AMBIT_FIRST_PRODUCT.items():
+            if compact:
+                values = out[col]
+                if value not in values.categories:
+                    values = values.add_categories([value])
+            else:
+                values = np.asarray(out[col], dtype=object)
+            values[ambit_first_mask] = value
+            out[col] = values
+
+    for col, values in out.items():
+        df[col] = values
+    return df
+
+
+# ---------------------------------------------------------------------------
+# Stage 5: output
+# ---------------------------------------------------------------------------
+
+BLANK_COLUMNS = ["Family Name Final", "Pk Remark", "Extra column", "Month-New", "YTD Tag", "Month-New For Banker MIS"]
+
+def finalize(df, original_cols, base_rows, compact=False):
+    for col in BLANK_COLUMNS:
+        df[col] = pd.Categorical.from_codes(np.zeros(len(df), dtype=np.int8), [""]) if compact else ""
+    final_column_order = [*original_cols, *DERIVED_COLUMNS]
+    final_column_order = [col for col in final_column_order if col in df.columns]
+    df = df[final_column_order]
+
+    assert len(df) == base_rows, f"Row mismatch! Input={base_rows}, Output={len(df)}"
+
+    working_mask = (df["Del Tag"] == "").to_numpy()
+    final_mask = working_mask & ((df["Consider"].notna()) & (df["Consider"] != "") & (df["Delete"].isna() | (df["Delete"] == ""))).to_numpy()
+    return df, working_mask, final_mask
+
+SUMMARY_KEYS = ["Banker Group Name", "Product Category New", "Gross Sales", "Net Sales", "NTB FY"]
+SUMMARY_COLUMNS = [*SUMMARY_KEYS, "Transactions", "Amt in Crs"]
+
+def _summary_label(value):
+    # A number looked up for a chunk where some rows did not match is gathered as a
+    # float; 2025.0 is labelled "2025" as it is where every row matched
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+def _summary_labels(values):
+    # Group labels as text, blank for missing values: the groups then sort, and the
+    # summaries of separate chunks or files line up when combined
+    codes, uniques = pd.factorize(values)
+    labels = np.array([*(_summary_label(v) for v in uniques), ""], dtype=object)
+    return labels[codes]
+
+def summarize(df, mask):
+    """Transactions and Amt in Crs of the rows in mask (the Final rows) per
+    SUMMARY_KEYS group, sorted by group."""
+    rows = df.loc[mask, [*SUMMARY_KEYS, "Amt in Crs"]]
+    summary = pd.DataFrame({col: _summary_labels(rows[col]) for col in SUMMARY_KEYS})
+    summary["Transactions"] = 1
+    summary["Amt in Crs"] = pd.to_numeric(rows["Amt in Crs"], errors="coerce").to_numpy()
+    return combine_summaries([summary])
+
+def combine_summaries(parts):
+    """One summary over several (chunks, files) with the groups added up."""
+    summary = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+    summary = summary.groupby(SUMMARY_KEYS, sort=True)[["Transactions", "Amt in Crs"]].sum().reset_index()
+    return summary[SUMMARY_COLUMNS]
+
+
+def process_frame(df, cols, lookups, original_cols, progress=_no_progress, stats=None, compact=False):
+    """Tagging, mapping and lookups for a frame of transactions (a whole file or one
+    chunk of it). Returns the ordered frame with its Working and Final row masks.
+
+    compact=True keeps the frame small: low-cardinality transaction columns and the
+    derived text columns are stored as categoricals (see compact_frame)."""
+    base_rows = len(df)
+    if compact:
+        with stage(stats, "compact_frame", base_rows) as record:
+            df = compact_frame(df)
+            record['rows_out'] = len(df)
+            record['frame'] = df
+    progress(40, "🏷️ Applying Ambit First Tags...")
+
+    with stage(stats, "tag_ambit_first", base_rows) as record:
+        df = tag_ambit_first(df, cols, lookups, compact)
+        record['rows_out'] = len(df)
+        record['frame'] = df
+    progress(45, "🏷️ Applying Del Tags...")
+
+    with stage(stats, "tag_del", base_rows) as record:
+        df = tag_del(df, cols, lookups, compact)
+        record['rows_out'] = int((df["Del Tag"] == "").sum())
+        record['frame'] = df
+    progress(55, "📝 Processing Transaction Types...")
+
+    with stage(stats, "map_transaction_types", base_rows) as record:
+        df = map_transaction_types(df, cols, lookups, compact)
+        record['rows_out'] = len(df)
+        record['frame'] = df
+    progress(65, "🔍 Looking up Scheme, Client, Employee and NTB masters...")
+
+    with stage(stats, "apply_lookups", base_rows) as record:
+        df = apply_lookups(df, cols, lookups, stats, compact)
+        record['rows_out'] = len(df)
+        record['frame'] = df
+    progress(90, "📋 Finalizing Data...")
+
+    with stage(stats, "finalize", base_rows) as record:
+        df, working_mask, final_mask = finalize(df, original_cols, base_rows, compact)
+        record['rows_out'] = int(final_mask.sum())
+        record['frame'] = df
+    return df, working_mask, final_mask
+
+def dependency_keys(df, cols, lookups):
+    """Per-row hash of everything a row's enrichment depends on besides its own
+    content and the rules: the master rows its lookups match and whether it is
+    Ambit First. A row whose key changes between runs has to be processed again."""
+    ws = ws_keys(df[cols['ws']])
+    pos = lookup_positions(encode(df[cols['sec']]), ws, lookups)
+    columns = {name: table_row_hashes(lookups[name])[pos[name]] for name in LOOKUP_KEYS}
+    columns['ambit_first'] = ws.isin(lookups['ambit_set'])
+    return combine_hashes(columns)
+
+def process_frame_incremental(df, cols, lookups, store, progress=_no_progress, stats=None, compact=False):
+    """process_frame for a whole WS transaction file against an IncrementalStore.
+
+    Rows already in the store with unchanged content and dependencies (see
+    dependency_keys) take their derived columns from it; only the rest go through the
+    tagging, mapping and lookup stages. The store is then replaced with this file's
+    rows. Returns the ordered frame, its Working and Final masks and the number of
+    reused rows."""
+    base_rows = len(df)
+    original_cols = df.columns.tolist()
+    derived_cols = [col for col in DERIVED_COLUMNS if col not in BLANK_COLUMNS]
+
+    with stage(stats, "incremental_match", base_rows) as record:
+        keys = row_keys(df)
+        deps = dependency_keys(df, cols, lookups)
+        digest = rules_digest(lookups)
+        stored = store.load(original_cols, digest)
+        if stored is None:
+            pos = np.full(base_rows, -1, dtype=np.intp)
+        else:
+            pos = positions(stored[ROW_KEY], keys)
+            found = pos >= 0
+            stale = np.zeros(base_rows, dtype=bool)
+            stale[found] = stored[DEPS_KEY].to_numpy()[pos[found]] != deps[found]
+            pos[stale] = -1
+        todo = pos < 0
+        record['rows_out'] = int(todo.sum())
+
+    if todo.all():
+        df, working_mask, final_mask = process_frame(df, cols, lookups, original_cols, progress, stats, compact)
+    else:
+        parts = [stored.iloc[pos[~todo]][derived_cols].set_axis(np.flatnonzero(~todo))]
+        if todo.any():
+            changed = df[todo].reset_index(drop=True)
+            changed, _, _ = process_frame(changed, cols, lookups, original_cols, progress, stats, compact)
+            parts.append(changed[derived_cols].set_axis(np.flatnonzero(todo)))
+        derived = pd.concat(parts).sort_index() if len(parts) > 1 else parts[0]
+        for col in derived_cols:
+            df[col] = derived[col].set_axis(df.index)
+        if compact:
+            # Stored and freshly processed values were combined as plain objects
+            with stage(stats, "compact_frame", base_rows) as record:
+                df = compact_frame(df)
+                record['rows_out'] = len(df)
+                record['frame'] = df
+        with stage(stats, "finalize", base_rows) as record:
+            df, working_mask, final_mask = finalize(df, original_cols, base_rows, compact)
+            record['rows_out'] = int(final_mask.sum())
+            record['frame'] = df
+
+    with stage(stats, "incremental_save", base_rows):
+        rows = pd.DataFrame({ROW_KEY: keys, DEPS_KEY: deps})
+        for col in derived_cols:
+            rows[col] = df[col].to_numpy()
+        store.save(original_cols, digest, rows)
+    return df, working_mask, final_mask, base_rows - int(todo.sum())
+
+def process_transactions(input_file, lookups, progress=_no_progress, formats=("xlsx",), output_dir=None, stem=MIS_STEM, chunk_rows=None, stats=None, incremental=None, extra_writers=(), compact=False, lazy=False):
+    """Run the tagging, mapping, lookup and output stages for one WS transaction file
+    against the lookups of an already reconciled master (see reconcile_masters).
+
+    Outputs are written in each of formats ("xlsx", "parquet", "csv"): to files in
+    output_dir when given, otherwise returned as bytes. 'outputs' maps file name to
+    path or bytes; 'mis_output' is the xlsx workbook bytes when produced in memory.
+    With chunk_rows the file is streamed through the stages that many rows at a time
+    (see process_transactions_streaming). Stage timings go to stats (a RunStats)
+    when given. With incremental (an IncrementalStore) only rows that are new or
+    whose master entries changed are processed (see process_frame_incremental).
+    extra_writers are MisWriter-like objects that also receive every written frame;
+    the caller closes them. compact=True stores text columns as categoricals (see
+    process_frame). 'mis_summary' is the Final rows' summarize() frame, which xlsx
+    outputs also carry as a Summary sheet. lazy=True (needs output_dir) only keeps
+    the processed rows; the output files are listed as usual but each is generated
+    on its first deferred.materialize()."""
+    if lazy and output_dir is None:
+        raise Exception("Lazy outputs need an output_dir to keep the processed rows in")
+    if chunk_rows:
+        if incremental is not None:
+            raise Exception("Incremental mode needs the whole transaction file; it cannot be combined with chunk_rows")
+        return process_transactions_streaming(input_file, lookups, chunk_rows, progress, formats, output_dir, stem, stats, extra_writers, compact, lazy)
+
+    progress(35, "📋 Loading Transaction Data...")
+    with stage(stats, "load_transactions") as record:
+        df, cols = load_transactions(input_file)
+        record['rows_out'] = len(df)
+        record['frame'] = df
+    return process_loaded_transactions(df, cols, lookups, progress, formats, output_dir, stem, stats, incremental, extra_writers, compact, lazy)
+
+def process_loaded_transactions(df, cols, lookups, progress=_no_progress, formats=("xlsx",), output_dir=None, stem=MIS_STEM, stats=None, incremental=None, extra_writers=(), compact=False, lazy=False):
+    """process_transactions for a WS transaction frame that is already parsed (see
+    reader.load_transactions)."""
+    if incremental is not None:
+        df, working_mask, final_mask, reused_rows = process_frame_incremental(df, cols, lookups, incremental, progress, stats, compact)
+    else:
+        df, working_mask, final_mask = process_frame(df, cols, lookups, df.columns.tolist(), progress, stats, compact)
+        reused_rows = 0
+    with stage(stats, "summarize", int(final_mask.sum())) as record:
+        summary = summarize(df, final_mask)
+        record['rows_out'] = len(summary)
+    progress(95, "💾 Saving Output Files...")
+
+    with stage(stats, "write_outputs", len(df)) as record:
+        if lazy:
+            part = FramePart(os.path.join(output_dir, f"{stem}.frame"))
+            part.write(df, working_mask, final_mask)
+            part.close()
+            outputs = defer_mis(output_dir, os.path.basename(part.path), formats, stem, summary)
+        elif output_dir is not None:
+            outputs = write_mis_files(df, working_mask, final_mask, formats, output_dir, stem, summary)
+        else:
+            outputs = write_mis_bytes(df, working_mask, final_mask, formats, stem, summary)
+        for writer in extra_writers:
+            writer.write(df, working_mask, final_mask)
+        record['rows_out'] = len(df)
+
+    return {
+        'outputs': outputs,
+        'mis_output': outputs.get(f"{stem}.xlsx") if output_dir is None else None,
+        'raw_rows': len(df),
+        'working_rows': int(working_mask.sum()),
+        'final_rows': int(final_mask.sum()),
+        'reused_rows': reused_rows,
+        'mis_summary': summary,
+    }
+
+def process_transactions_streaming(input_file, lookups, chunk_rows, progress=_no_progress, formats=("xlsx",), output_dir=None, stem=MIS_STEM, stats=None, extra_writers=(), compact=False, lazy=False):
+    """Low-memory variant of process_transactions.
+
+    The transaction sheet is read in read-only mode chunk_rows rows at a time; each
+    chunk goes through the tagging, mapping and lookup stages and is appended to the
+    streaming writers, so peak memory follows chunk_rows rather than the file size.
+    The chunk summaries are combined into one at the end."""
+    estimated_rows, chunks = open_transaction_chunks(input_file, chunk_rows)
+    if lazy:
+        writers = [FramePart(os.path.join(output_dir, f"{stem}.frame"))]
+    else:
+        targets, files = mis_targets(formats, stem, output_dir)
+        writers = [MisWriter(fmt, targets[fmt], widen=True) for fmt in formats]
+    summaries = []
+
+    cols = original_cols = None
+    base_rows = raw_rows = working_rows = final_rows = 0
+    for chunk in timed_iter(stats, "load_transactions", chunks):
+        base_rows += len(chunk)
+        chunk = strip_time_from_dates(chunk)
+        if cols is None:
+            cols = transaction_columns(chunk)
+            original_cols = chunk.columns.tolist()
+        chunk, working_mask, final_mask = process_frame(chunk, cols, lookups, original_cols, stats=stats, compact=compact)
+        with stage(stats, "summarize", int(final_mask.sum())) as record:
+            summaries.append(summarize(chunk, final_mask))
+            record['rows_out'] = len(summaries[-1])
+        with stage(stats, "write_outputs", len(chunk)) as record:
+            for writer in [*writers, *extra_writers]:
+                writer.write(chunk, working_mask, final_mask)
+            record['rows_out'] = len(chunk)
+        raw_rows += len(chunk)
+        working_rows += int(working_mask.sum())
+        final_rows += int(final_mask.sum())
+        done = min(base_rows / estimated_rows, 1) if estimated_rows else 0
+        progress(40 + int(55 * done), f"⚙️ Processed {base_rows:,} rows...")
+
+    assert raw_rows == base_rows, f"Row mismatch! Input={base_rows}, Output={raw_rows}"
+    progress(95, "💾 Saving Output Files...")
+    with stage(stats, "summarize"):
+        summary = combine_summaries(summaries) if summaries else None
+    with stage(stats, "write_outputs"):
+        if lazy:
+            writers[0].close()
+            files = defer_mis(output_dir, os.path.basename(writers[0].path), formats, stem, summary)
+        else:
+            for writer in writers:
+                writer.close(summary)
+
+    outputs = collect_outputs(files) if output_dir is None else files
+    return {
+        'outputs': outputs,
+        'mis_output': outputs.get(f"{stem}.xlsx") if output_dir is None else None,
+        'raw_rows': raw_rows,
+        'working_rows': working_rows,
+        'final_rows': final_rows,
+        'reused_rows': 0,
+        'mis_summary': summary,
+    }
+
+def run_pipeline(input_file, system_client_file, system_scheme_file, master_file, progress=_no_progress, cache=None, formats=("xlsx",), chunk_rows=None, parse_workers=None, profile=False, output_dir=None, incremental=None, compact=False, lazy=False):
+    """Full run: reconcile the MASTER, then process the WS transaction file against it.
+
+    The four workbooks are parsed concurrently across up to parse_workers processes
+    (default: one per workbook, capped at the CPU count; 1 parses them in turn).
+    'stats' in the result is the run's RunStats as a dict; profile=True adds a
+    cProfile summary to it. With output_dir, the MIS files and the updated master
+    (MASTER_FILE_NAME) are written there and the result holds their paths instead
+    of bytes. incremental is an optional IncrementalStore for month-to-date files;
+    'reused_rows' counts the rows taken from it. compact=True is the low-memory
+    categorical representation (see process_frame); profiled runs also record each
+    stage's frame size. 'mis_summary' is the summarize() frame of the Final rows.
+    lazy=True defers the MIS files and the updated master until they are first asked
+    for (see deferred.materialize); it needs output_dir."""
+    if lazy and output_dir is None:
+        raise Exception("Lazy outputs need an output_dir to keep the processed rows in")
+    proc_start = time.time()
+    stats = RunStats(profile=profile, frame_memory=profile)
+    sources = {'client': system_client_file, 'scheme': system_scheme_file, 'master': master_file}
+    if not chunk_rows:
+        # The transaction file is parsed alongside the masters unless it is streamed
+        sources['txn'] = input_file
+    with stats.profiling():
+        with stage(stats, "prepare_inputs"):
+            reconciled, loaded = _prepare_inputs(sources, progress, cache, parse_workers, stats)
+        if loaded is not None:
+            result = process_loaded_transactions(*loaded, reconciled['lookups'], progress, formats=formats, output_dir=output_dir, stats=stats, incremental=incremental, compact=compact, lazy=lazy)
+        else:
+            result = process_transactions(input_file, reconciled['lookups'], progress, formats=formats, output_dir=output_dir, chunk_rows=chunk_rows, stats=stats, incremental=incremental, compact=compact, lazy=lazy)
+        with stage(stats, "save_master"):
+            master_args = (reconciled['master_bytes'], reconciled['new_client_rows'], reconciled['new_scheme_rows'])
+            if lazy:
+                master_output = defer_call(output_dir, MASTER_FILE_NAME, save_master_workbook, *master_args)
+            else:
+                master_output = save_master_workbook(*master_args)
+                if output_dir is not None:
+                    master_path = os.path.join(output_dir, MASTER_FILE_NAME)
+                    with open(master_path, "wb") as f:
+                        f.write(master_output)
+                    master_output = master_path
+    progress(100, "✅ Processing Complete!")
+    return {
+        'mis_output': result['mis_output'],
+        'outputs': result['outputs'],
+        'master_output': master_output,
+        'new_clients': reconciled['new_clients'],
+        'new_schemes': reconciled['new_schemes'],
+        'raw_rows': result['raw_rows'],
+        'working_rows': result['working_rows'],
+        'final_rows': result['final_rows'],
+        'reused_rows': result['reused_rows'],
+        'mis_summary': result['mis_summary'],
+        'processing_time': time.time() - proc_start,
+        'stats': stats.to_dict(),
+    }
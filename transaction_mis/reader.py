@@ -0,0 +1,147 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from .excel import read_excel
+from .master import SYSTEM_SHEETS, load_master
+from .utils import find_col, strip_time_from_dates
+
+DEFAULT_CHUNK_ROWS = 100_000
+
+PARSE_LABELS = {
+    'txn': "WS Transaction File",
+    'client': "System Client Master",
+    'scheme': "System Scheme Master",
+    'master': "MASTER",
+}
+
+
+def load_transactions(input_file):
+    df = read_excel(input_file)
+    df = strip_time_from_dates(df)
+    return df, transaction_columns(df)
+
+def transaction_columns(df):
+    return {
+        'client': find_col(df, ["client name"]),
+        'ws': find_col(df, ["ws account code"]),
+        'sec': find_col(df, ["security code"]),
+        'trf': find_col(df, ["trfamt", "transfer amount"]),
+        'net': find_col(df, ["net amount", "amount"]),
+        'txn': find_col(df, ["tran desc", "transaction description"]),
+        'desc': find_col(df, ["descmemo", "desc memo", "description memo"]),
+    }
+
+def parse_input(kind, data):
+    """Parse one uploaded workbook (bytes or path) by role; see PARSE_LABELS."""
+    if kind == 'txn':
+        return load_transactions(data)
+    if kind == 'master':
+        return load_master(data)
+    return read_excel(data, *SYSTEM_SHEETS[kind])
+
+def _timed_parse(kind, data):
+    start = time.perf_counter()
+    result = parse_input(kind, data)
+    return result, time.perf_counter() - start
+
+def iter_parsed(jobs, workers=None):
+    """Parse {kind: bytes} workbooks concurrently in a process pool, yielding
+    (kind, result, seconds) as each one finishes, where seconds is the time the parse
+    itself took. With one job or workers <= 1 they are parsed in turn in this process."""
+    if workers is None:
+        workers = min(len(jobs), os.cpu_count() or 1)
+    if workers <= 1 or len(jobs) <= 1:
+        for kind, data in jobs.items():
+            yield kind, *_timed_parse(kind, data)
+        return
+
+    # Spawned, not forked: the app calls this from job threads, and a forked child
+    # can inherit locks other threads were holding
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        futures = {pool.submit(_timed_parse, kind, data): kind for kind, data in jobs.items()}
+        for future in as_completed(futures):
+            yield futures[future], *future.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def header_names(header):
+    """Column names for a worksheet header row, named as pd.read_excel names them:
+    blank headers become "Unnamed: i", repeats get ".1", ".2"..."""
+    names = []
+    seen = {}
+    for i, value in enumerate(header):
+        name = f"Unnamed: {i}" if value is None or (isinstance(value, str) and not value.strip()) else value
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def _convert_cell(value):
+    # pd.read_excel turns whole-number floats into ints
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def _frame(rows, columns):
+    df = pd.DataFrame(rows, columns=columns, dtype=object)
+    return df.infer_objects()
+
+
+def open_transaction_chunks(input_file, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Stream the first sheet of a WS transaction workbook in read-only mode.
+
+    Returns (estimated_rows, chunks) where chunks yields DataFrames of at most
+    chunk_rows rows with the header row applied, so only one chunk of cells is ever
+    materialized. estimated_rows comes from the sheet dimensions and may be None."""
+    if isinstance(input_file, (bytes, bytearray)):
+        input_file = BytesIO(input_file)
+    elif hasattr(input_file, "seek"):
+        input_file.seek(0)
+    wb = load_workbook(input_file, read_only=True, data_only=True)
+    ws = wb.worksheets[0]
+    estimated_rows = ws.max_row - 1 if ws.max_row else None
+
+    def chunks():
+        try:
+            rows = ws.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                raise Exception("Transaction file is empty")
+            columns = header_names(header)
+            width = len(columns)
+
+            buffer = []
+            pending_blank = 0
+            emitted = False
+            for row in rows:
+                if all(v is None for v in row):
+                    # Trailing blank rows are dropped like pd.read_excel does; interior
+                    # ones are kept once a later non-blank row shows up.
+                    pending_blank += 1
+                    continue
+                if pending_blank:
+                    buffer.extend([(None,) * width] * pending_blank)
+                    pending_blank = 0
+                row = tuple(_convert_cell(v) for v in row[:width])
+                buffer.append(row + (None,) * (width - len(row)))
+                if len(buffer) >= chunk_rows:
+                    yield _frame(buffer[:chunk_rows], columns)
+                    buffer = buffer[chunk_rows:]
+                    emitted = True
+            if buffer or not emitted:
+                yield _frame(buffer, columns)
+        finally:
+            wb.close()
+
+    return estimated_rows, chunks()
@@ -0,0 +1,128 @@
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+from .deferred import is_deferred, materialize, output_names
+
+DEFAULT_TTL_SECONDS = 24 * 3600
+DEFAULT_MAX_BYTES = 5 * 1024 ** 3
+SUMMARY_FILE = "result.json"
+
+_RUN_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def _dir_size(path):
+    total = 0
+    for dirpath, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+class ResultStore:
+    """On-disk store of finished run outputs, one directory per run id.
+
+    A run's files are written straight into path(run_id) by the pipeline (see
+    run_pipeline's output_dir) and read back on download, so output bytes never have
+    to stay in server memory. Outputs a run deferred (run_pipeline's lazy) are
+    generated the first time they are opened and kept from then on. Runs expire
+    ttl_seconds after their last write, and when the store grows beyond max_bytes
+    the oldest finished runs are removed first. A run without its summary
+    (save_summary) is still being written and is only removed once it expires."""
+
+    def __init__(self, root, ttl_seconds=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def create(self):
+        """Reserve a directory for a new run and return its id."""
+        run_id = uuid.uuid4().hex
+        os.makedirs(self.path(run_id))
+        self.evict(keep=(run_id,))
+        return run_id
+
+    def path(self, run_id, name=None):
+        if not _RUN_ID.fullmatch(str(run_id)):
+            raise Exception(f"Invalid run id {run_id!r}")
+        if name is None:
+            return os.path.join(self.root, run_id)
+        if os.path.basename(name) != name:
+            raise Exception(f"Invalid file name {name!r}")
+        return os.path.join(self.root, run_id, name)
+
+    def exists(self, run_id, name=None):
+        if not _RUN_ID.fullmatch(str(run_id or "")):
+            return False
+        path = self.path(run_id)
+        if not os.path.isdir(path) or self._expired(path):
+            return False
+        return name is None or os.path.exists(self.path(run_id, name)) or is_deferred(self.path(run_id, name))
+
+    def files(self, run_id):
+        if not self.exists(run_id):
+            return []
+        return [name for name in output_names(self.path(run_id)) if name != SUMMARY_FILE]
+
+    def open(self, run_id, name):
+        return open(materialize(self.path(run_id, name)), "rb")
+
+    def read(self, run_id, name):
+        with self.open(run_id, name) as f:
+            return f.read()
+
+    def save_summary(self, run_id, summary):
+        tmp_path = self.path(run_id, f"{SUMMARY_FILE}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(summary, f, default=str)
+        os.replace(tmp_path, self.path(run_id, SUMMARY_FILE))
+
+    def load_summary(self, run_id):
+        if not self.exists(run_id, SUMMARY_FILE):
+            return None
+        with open(self.path(run_id, SUMMARY_FILE)) as f:
+            return json.load(f)
+
+    def discard(self, run_id):
+        if _RUN_ID.fullmatch(str(run_id or "")):
+            shutil.rmtree(self.path(run_id), ignore_errors=True)
+
+    def evict(self, keep=()):
+        """Drop expired runs, then the oldest finished ones while the store is over
+        max_bytes. Runs in keep and runs still being written count towards the size
+        but are not removed."""
+        with self._lock:
+            runs = []
+            active_size = 0
+            for run_id in os.listdir(self.root):
+                path = os.path.join(self.root, run_id)
+                if not _RUN_ID.fullmatch(run_id) or not os.path.isdir(path):
+                    continue
+                if run_id not in keep and self._expired(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                    continue
+                if run_id in keep or not os.path.exists(os.path.join(path, SUMMARY_FILE)):
+                    active_size += _dir_size(path)
+                    continue
+                runs.append((os.path.getmtime(path), _dir_size(path), path))
+            runs.sort()
+            total = sum(size for _, size, _ in runs) + active_size
+            while runs and total > self.max_bytes:
+                _, size, path = runs.pop(0)
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+
+    def _expired(self, path):
+        try:
+            return time.time() - os.path.getmtime(path) > self.ttl_seconds
+        except OSError:
+            return True
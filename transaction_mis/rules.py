@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+from .utils import normalize_col
+
+DEL_TAG_RULES_SHEET = "Del Tag Rules"
+DEL_TAG_RULE_COLUMNS = ["tag", "column", "match", "pattern", "skip_ambit_first"]
+
+# Ordered: the first rule that matches a row decides its Del Tag.
+#   column: 'length' (the Length column), 'ws' (cleaned WS account code), 'client' or 'sec'
+#   match:  'equals', 'prefix' (comma separated, case-insensitive) or 'contains' (case-insensitive text,
+#           not a regex, so sheet patterns like "A.B (Pvt)" match literally)
+DEFAULT_DEL_TAG_RULES = [
+    ("Del PAN", "length", "equals", "10", False),
+    ("Del PMS", "ws", "prefix", "ND,DS,DM", True),
+    ("Del AWPL", "client", "contains", "ambit wealth", False),
+    ("Del AFPL", "client", "contains", "Ambit Finvest Private Limited", False),
+    ("Del Dummy", "client", "contains", "dummy", False),
+    ("Del Cash", "sec", "contains", "cash", False),
+    ("Del TDSAccount", "sec", "contains", "tds", False),
+    ("Del MFApplication", "sec", "contains", "mfapplication", False),
+    ("Del INTACCPUR", "sec", "contains", "intaccpur", False),
+]
+
+_RULE_SOURCES = {
+    "length": "length",
+    "ws": "ws", "wsaccountcode": "ws",
+    "client": "client", "clientname": "client",
+    "sec": "sec", "securitycode": "sec",
+}
+_RULE_MATCHES = ("equals", "prefix", "contains")
+
+
+def _pattern_text(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+def _flag(value):
+    return str(value).strip().lower() in ("true", "yes", "y", "1")
+
+def default_del_tag_rules():
+    return pd.DataFrame(DEFAULT_DEL_TAG_RULES, columns=DEL_TAG_RULE_COLUMNS)
+
+def parse_del_tag_rules(sheet):
+    """Turn a "Del Tag Rules" MASTER sheet (Tag, Column, Match, Pattern, Skip Ambit First)
+    into the rule table used by classify_del_tags. Row order is rule precedence."""
+    col_map = {normalize_col(c): c for c in sheet.columns}
+    missing = [c for c in ("tag", "column", "match", "pattern") if c not in col_map]
+    if missing:
+        raise Exception(f"{DEL_TAG_RULES_SHEET} sheet is missing columns: {missing}")
+
+    rows = []
+    for _, r in sheet.dropna(subset=[col_map["tag"]]).iterrows():
+        source = _RULE_SOURCES.get(normalize_col(r[col_map["column"]]))
+        match = str(r[col_map["match"]]).strip().lower()
+        if source is None or match not in _RULE_MATCHES:
+            raise Exception(f"Invalid Del Tag rule for {r[col_map['tag']]!r}: column={r[col_map['column']]!r}, match={r[col_map['match']]!r}")
+        skip = _flag(r[col_map["skipambitfirst"]]) if "skipambitfirst" in col_map else False
+        rows.append((str(r[col_map["tag"]]).strip(), source, match, _pattern_text(r[col_map["pattern"]]), skip))
+    return pd.DataFrame(rows, columns=DEL_TAG_RULE_COLUMNS)
+
+
+def _match_uniques(uniques, match, pattern):
+    if match == "equals":
+        return np.asarray([_pattern_text(u).upper() == pattern.upper() for u in uniques], dtype=bool)
+    if match == "prefix":
+        prefixes = tuple(p.strip().upper() for p in pattern.split(",") if p.strip())
+        return pd.Series(uniques, dtype=object).astype(str).str.upper().str.startswith(prefixes).to_numpy(dtype=bool)
+    return pd.Series(uniques, dtype=object).str.contains(pattern, case=False, regex=False, na=False).to_numpy(dtype=bool)
+
+def classify_del_tags(df, cols, rules):
+    """Assign every row the tag of its first matching rule in one pass per source column.
+
+    Each source column is factorized once (the WS and Security codes arrive encoded
+    from tag_ambit_first) and the rules are evaluated on its distinct values only;
+    per-row results are the lowest matching rule index gathered through the factor
+    codes, so rule precedence is the same as applying the rules one by one."""
+    n_rules = len(rules)
+    sources = {"length": df["Length"], "ws": df["_ws"], "client": df[cols['client']], "sec": df["_sec"]}
+    best = np.full(len(df), n_rules, dtype=np.int32)
+    ambit_blank = None
+
+    for source, group in rules.groupby("column", sort=False):
+        codes, uniques = pd.factorize(sources[source], use_na_sentinel=True)
+        uniques = np.asarray(uniques, dtype=object)
+        plain = np.full(len(uniques) + 1, n_rules, dtype=np.int32)
+        gated = np.full(len(uniques) + 1, n_rules, dtype=np.int32)
+        # Walk rules from lowest precedence up so earlier rules overwrite later ones
+        for idx in reversed(group.index.tolist()):
+            rule = rules.loc[idx]
+            hit = np.append(_match_uniques(uniques, rule["match"], rule["pattern"]), False)
+            target = gated if rule["skip_ambit_first"] else plain
+            target[hit] = idx
+        # codes == -1 (missing values) picks the trailing "no match" slot
+        best = np.minimum(best, plain[codes])
+        if (gated < n_rules).any():
+            if ambit_blank is None:
+                ambit_blank = (df["Ambit First"] == "").to_numpy()
+            best = np.where(ambit_blank, np.minimum(best, gated[codes]), best)
+
+    tags = np.array([*rules["tag"].tolist(), ""], dtype=object)
+    df["Del Tag"] = tags[best]
+    return df
@@ -0,0 +1,224 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+from .outputs import iter_chunks
+
+# A worksheet holds 1,048,576 rows including the header
+XLSX_MAX_ROWS = 1_048_575
+
+SYNTHETIC_FILES = {
+    'txn': "WS_Transactions.xlsx",
+    'client': "System_Client_Master.xlsx",
+    'scheme': "System_Scheme_Master.xlsx",
+    'master': "MASTER.xlsx",
+}
+
+TRAN_DESCS = ["Purchase", "Redemption", "SIP", "Switch In", "Switch Out", "SWP", "InFlow", "OutFlow", "Dividend Payout", "Management Fee"]
+TRNX_TYPE_REPLACE = ["Purchase", "Redemption", "SIP", "Switch In", "Switch Out", "SWP", "AUM Trf In", "AUM Trf Out", "", ""]
+TRNX_TYPE_DELETE = ["", "", "", "", "", "", "", "", "Dividend Payout", "Management Fee"]
+TRAN_DESC_WEIGHTS = [0.22, 0.14, 0.25, 0.06, 0.06, 0.03, 0.08, 0.06, 0.05, 0.05]
+
+PRODUCTS = [("Mutual Fund", "Equity", "Equity MF"), ("Mutual Fund", "Debt", "Debt MF"), ("Mutual Fund", "Hybrid", "Hybrid MF"),
+            ("PMS", "Equity", "Equity PMS"), ("AIF", "Alternates", "Cat III AIF"), ("Bonds", "Debt", "Corporate Bonds")]
+MANUFACTURERS = ["HDFC AMC", "ICICI Prudential AMC", "SBI Funds", "Axis AMC", "Kotak AMC", "Nippon AMC", "Ambit Asset Management"]
+MONTHS = ["Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec", "Jan", "Feb", "Mar"]
+
+# Rows that exercise each built-in Del Tag rule: (client code, client name)
+_SPECIAL_CLIENTS = [("ND000001", "Ambit PMS Client One"), ("DS000002", "Ambit PMS Client Two"), ("DM000003", "Ambit PMS Client Three"),
+                    ("ABCDE1234F", "PAN Coded Client"), ("WS900004", "Ambit Wealth Private Limited"),
+                    ("WS900005", "Ambit Finvest Private Limited"), ("WS900006", "Dummy Account")]
+_SPECIAL_SCHEMES = ["CASH", "TDSACCOUNT", "MFAPPLICATION", "INTACCPUR"]
+
+
+def _universe(rows, seed):
+    rng = np.random.default_rng(seed)
+    n_clients = max(100, rows // 25)
+    n_schemes = max(40, min(rows // 40, 50_000))
+    n_bankers = max(20, min(n_clients // 200, 400))
+    n_families = max(30, n_clients // 3)
+
+    codes = np.array([f"WS{i:06d}" for i in range(n_clients)], dtype=object)
+    names = np.array([f"Client {i:06d}" for i in range(n_clients)], dtype=object)
+    for i, (code, name) in enumerate(_SPECIAL_CLIENTS):
+        codes[i], names[i] = code, name
+    symbols = np.array([f"MF{i:06d}" for i in range(n_schemes)], dtype=object)
+    symbols[:len(_SPECIAL_SCHEMES)] = _SPECIAL_SCHEMES
+    bankers = np.array([f"Banker {i:03d}" for i in range(n_bankers)], dtype=object)
+    families = np.array([f"Family {i:06d}" for i in range(n_families)], dtype=object)
+
+    return {
+        'rng': rng,
+        'codes': codes,
+        'names': names,
+        'symbols': symbols,
+        'bankers': bankers,
+        'families': families,
+        'client_family': families[rng.integers(0, n_families, n_clients)],
+        'client_banker': bankers[rng.integers(0, n_bankers, n_clients)],
+        'scheme_product': rng.integers(0, len(PRODUCTS), n_schemes),
+        'scheme_manufacturer': np.array(MANUFACTURERS, dtype=object)[rng.integers(0, len(MANUFACTURERS), n_schemes)],
+    }
+
+def transaction_frame(rows, universe, start=0):
+    """rows WS transactions drawn from universe. Clients and schemes follow a
+    skewed distribution so a few accounts carry most of the activity, as in a real dump."""
+    rng = universe['rng']
+    n_clients, n_schemes = len(universe['codes']), len(universe['symbols'])
+    client_idx = np.minimum((rng.pareto(1.2, rows) * n_clients / 20).astype(np.int64), n_clients - 1)
+    scheme_idx = np.minimum((rng.pareto(1.0, rows) * n_schemes / 15).astype(np.int64), n_schemes - 1)
+    desc_idx = rng.choice(len(TRAN_DESCS), size=rows, p=TRAN_DESC_WEIGHTS)
+    net = np.round(rng.lognormal(11, 1.4, rows), 2)
+    transfer = np.where(desc_idx >= 6, np.round(net * rng.uniform(0.9, 1.1, rows), 2), 0.0)
+
+    return pd.DataFrame({
+        "Trade Date": pd.Timestamp("2025-04-01") + pd.to_timedelta(rng.integers(0, 30, rows), unit="D"),
+        "Transaction No": np.arange(start + 1, start + rows + 1),
+        "WS Account Code": universe['codes'][client_idx],
+        "Client Name": universe['names'][client_idx],
+        "Security Code": universe['symbols'][scheme_idx],
+        "Security Name": [f"Scheme {s}" for s in universe['symbols'][scheme_idx]],
+        "Tran Desc": np.array(TRAN_DESCS, dtype=object)[desc_idx],
+        "DescMemo": np.where(rng.random(rows) < 0.08, "Broker Change", "Online"),
+        "Quantity": np.round(net / rng.uniform(10, 500, rows), 3),
+        "TrfAmt": transfer,
+        "Net Amount": net,
+        "Branch": np.array(["Mumbai", "Delhi", "Bengaluru", "Kolkata", "Chennai"], dtype=object)[rng.integers(0, 5, rows)],
+    })
+
+def system_client_frame(universe):
+    codes = universe['codes']
+    return pd.DataFrame({
+        "CLIENTID": np.arange(1, len(codes) + 1),
+        "CLIENTNAME": universe['names'],
+        "CLIENTCODE": codes,
+        "PANNUMBER": [f"ABCPD{i % 10000:04d}K" for i in range(len(codes))],
+        "GROUPNAME": universe['client_family'],
+        "RELMGRNAME": universe['client_banker'],
+        "BILLGROUP": "Retail",
+        "CITY": "Mumbai",
+    })
+
+def system_scheme_frame(universe):
+    symbols = universe['symbols']
+    products = [PRODUCTS[i] for i in universe['scheme_product']]
+    return pd.DataFrame({
+        "SYMBOLID": symbols,
+        "SYMBOLNAME": [f"Scheme {s}" for s in symbols],
+        "ISINCODE": [f"INF{i:09d}" for i in range(len(symbols))],
+        "REFSYMBOL5": [f"R{i:06d}" for i in range(len(symbols))],
+        "DIMNAME15": [p[0] for p in products],
+        "ASTCLSNAME": [p[1] for p in products],
+        "DIMNAME13": [p[2] for p in products],
+    })
+
+def master_frames(universe, system_client, system_scheme, missing_share=0.05):
+    """MASTER sheets consistent with the system masters; missing_share of the clients
+    and schemes are left out so reconciliation has rows to add."""
+    rng = universe['rng']
+    client_keep = rng.random(len(system_client)) >= missing_share
+    scheme_keep = rng.random(len(system_scheme)) >= missing_share
+
+    scheme = system_scheme[scheme_keep].rename(columns={"SYMBOLNAME": "Scheme name", "ISINCODE": "ISIN", "REFSYMBOL5": "Symbolcode5", "DIMNAME15": "DIMNAME15 Old"})
+    scheme = scheme.assign(**{"DIMNAME15 - New": scheme["DIMNAME15 Old"], "ASTCLSNAME New": scheme["ASTCLSNAME"],
+                              "Manufacturer Name": universe['scheme_manufacturer'][scheme_keep]})
+
+    bankers = universe['bankers']
+    families = universe['families']
+    ntb_families = families[rng.random(len(families)) < 0.2]
+    regular_codes = universe['codes'][len(_SPECIAL_CLIENTS):]
+    return {
+        "Client Master": system_client[client_keep].drop(columns=["CITY"]),
+        "Scheme Master": scheme,
+        "Ambit First": pd.DataFrame({"ClientCode": regular_codes[rng.random(len(regular_codes)) < 0.02]}),
+        "Trnx Type Update": pd.DataFrame({"Tran Desc": TRAN_DESCS, "Replace": TRNX_TYPE_REPLACE, "Remarks": "", "Updated By": "", "Delete": TRNX_TYPE_DELETE}),
+        "Employee Mapping Master": pd.DataFrame({"Banker Name": bankers, "Banker Name New": [f"{b} (New)" for b in bankers],
+                                                 "Banker Group Name": [f"Group {i % 8}" for i in range(len(bankers))],
+                                                 "Group Tag": [("Wealth", "Private", "Family Office")[i % 3] for i in range(len(bankers))]}),
+        "NTB Data": pd.DataFrame({"Family Name": ntb_families, "Month": np.array(MONTHS, dtype=object)[rng.integers(0, 12, len(ntb_families))], "FY": "FY 2025-26"}),
+    }
+
+
+def _write_frame(ws, df):
+    ws.append([str(c) for c in df.columns])
+    for chunk in iter_chunks(df):
+        for row in chunk.astype(object).to_numpy().tolist():
+            ws.append(row)
+
+def write_transactions(path, rows, universe, chunk_rows=100_000):
+    """Stream rows synthetic transactions into a single-sheet workbook, chunk_rows at
+    a time, so multi-million-row files never exist as one frame."""
+    if rows > XLSX_MAX_ROWS:
+        raise Exception(f"A worksheet holds at most {XLSX_MAX_ROWS:,} data rows; use transaction_frame() for larger benchmarks")
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Transactions")
+    for start in range(0, rows, chunk_rows):
+        chunk = transaction_frame(min(chunk_rows, rows - start), universe, start=start)
+        if start == 0:
+            ws.append(list(chunk.columns))
+        for row in chunk.astype(object).to_numpy().tolist():
+            ws.append(row)
+    wb.save(path)
+
+def write_master(path, sheets):
+    wb = Workbook(write_only=True)
+    for name, df in sheets.items():
+        ws = wb.create_sheet(name)
+        if name == "Scheme Master":
+            # The real sheet has a title row above its header
+            ws.append(["Scheme Master"])
+        _write_frame(ws, df)
+    wb.save(path)
+
+def generate_workbooks(out_dir, rows, seed=0):
+    """Write a WS transaction file with rows rows plus matching System Client, System
+    Scheme and MASTER workbooks into out_dir. Returns {role: path} (see SYNTHETIC_FILES)."""
+    os.makedirs(out_dir, exist_ok=True)
+    universe = _universe(rows, seed)
+    paths = {kind: os.path.join(out_dir, name) for kind, name in SYNTHETIC_FILES.items()}
+
+    system_client = system_client_frame(universe)
+    system_scheme = system_scheme_frame(universe)
+    system_client.to_excel(paths['client'], index=False)
+    system_scheme.to_excel(paths['scheme'], index=False)
+    write_master(paths['master'], master_frames(universe, system_client, system_scheme))
+    write_transactions(paths['txn'], rows, universe)
+    return paths
+
+def generate_frames(rows, seed=0):
+    """In-memory counterpart of generate_workbooks with no worksheet row limit.
+
+    Returns {'txn', 'client', 'scheme': DataFrame, 'master': sheets shaped like
+    load_master output}. Transactions are returned as one frame."""
+    universe = _universe(rows, seed)
+    system_client = system_client_frame(universe)
+    system_scheme = system_scheme_frame(universe)
+    sheets = master_frames(universe, system_client, system_scheme)
+    master = {
+        'client': sheets["Client Master"].reset_index(drop=True),
+        'scheme': sheets["Scheme Master"].reset_index(drop=True),
+        'ambit_first': sheets["Ambit First"],
+        'trnx_type': sheets["Trnx Type Update"],
+        'employee': sheets["Employee Mapping Master"],
+        'ntb': sheets["NTB Data"],
+        'del_tag_rules': None,
+    }
+    return {'txn': transaction_frame(rows, universe), 'client': system_client, 'scheme': system_scheme, 'master': master}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m transaction_mis.synthetic", description="Generate synthetic WS transaction, system master and MASTER workbooks.")
+    parser.add_argument("rows", type=int, help=f"number of transaction rows (at most {XLSX_MAX_ROWS:,})")
+    parser.add_argument("out_dir", help="directory the four workbooks are written to")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    for kind, path in generate_workbooks(args.out_dir, args.rows, args.seed).items():
+        print(f"{kind}: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
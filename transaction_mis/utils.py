@@ -0,0 +1,31 @@
+import re
+
+import pandas as pd
+
+
+def normalize_col(c):
+    return re.sub(r'[^a-z0-9]', '', str(c).lower())
+
+def find_col(df, possible):
+    col_map = {normalize_col(c): c for c in df.columns}
+    for p in possible:
+        if normalize_col(p) in col_map:
+            return col_map[normalize_col(p)]
+    raise Exception(f"Missing column. Tried {possible}")
+
+def strip_time_from_dates(df):
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.date
+    return df
+
+def read_bytes(src):
+    # Accepts raw bytes, an uploaded/file-like object or a path
+    if isinstance(src, (bytes, bytearray)):
+        return bytes(src)
+    if hasattr(src, "getvalue"):
+        return src.getvalue()
+    if hasattr(src, "read"):
+        return src.read()
+    with open(src, "rb") as f:
+        return f.read()